@@ -3,16 +3,26 @@ from app.routes.fr.routes import router as fr_router
 from app.routes.fr.users import user_router as fr_user_router
 from app.routes.en.routes import router as en_router
 from app.routes.en.users import user_router as en_user_router
-from fastapi.responses import RedirectResponse
+from app.routes.api.dossiers import api_router
+from fastapi.responses import RedirectResponse, JSONResponse, PlainTextResponse
 from pydantic import ValidationError
 from fastapi import Request
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from app.database import create_database, initialiser_db, delete_database, vider_db
+from app.database import initialiser_db, engine, replica_engine, read_primary, READ_YOUR_WRITES_SECONDS
+from app.metrics import MetricsMiddleware, instrument_engine, render_metrics
+from app.sql_monitor import instrument_queries
+from app.profiler import ProfilerMiddleware, profiler
+from app.migrations.runner import upgrade, verify
+from app.services.dashboard import has_dossier_aggregates, rebuild_dossier_aggregates
+from app.services.retention import retention_worker
+from app.services.reminders import reminder_scheduler
+from app.workers import start_background_jobs, stop_background_jobs
 from app.errors import ChangeMdpError
 from dotenv import load_dotenv
 from starlette.middleware.base import BaseHTTPMiddleware
 from urllib.parse import urlencode
+import os
 
 
 #Structure of the app
@@ -22,6 +32,7 @@ app.include_router(fr_router)
 app.include_router(fr_user_router)
 app.include_router(en_router)
 app.include_router(en_user_router)
+app.include_router(api_router)
 #Include css file(s) and images
 app.mount("/static", StaticFiles(directory="static"), name="static")
 #Locate templates (html pages) folder
@@ -56,11 +67,44 @@ class LanguageMiddleware(BaseHTTPMiddleware):
 
 app.add_middleware(LanguageMiddleware)
 
+# Methods that only read
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Read your writes: the page shown after a form (redirect) must not be read on a replica that lags
+class ReadYourWritesMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        wrote = request.method not in SAFE_METHODS
+        token = read_primary.set(wrote or "read_primary" in request.cookies)
+        try:
+            response = await call_next(request)
+        finally:
+            read_primary.reset(token)
+        # The next requests of the client read the primary for a few seconds
+        if wrote:
+            response.set_cookie(key="read_primary", value="1", max_age=READ_YOUR_WRITES_SECONDS, httponly=True)
+        return response
+
+# Without replica every read already goes to the primary
+if replica_engine is not engine:
+    app.add_middleware(ReadYourWritesMiddleware)
+# ?profile=1 for the admins: the answer is the profile of the request
+app.add_middleware(ProfilerMiddleware)
+# Added last -> outermost, the latency includes the other middlewares
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine, "primary")
+instrument_queries(engine, "primary")
+if replica_engine is not engine:
+    instrument_engine(replica_engine, "replica")
+    instrument_queries(replica_engine, "replica")
+
 #Get any 404 error from app and catch it then redirect to tmp page -> tmp redirect then to error
 #Why using tmp ? Impossible to import login_manager in app_file ? So we use tmp to see if user is connected or not 
 #-> choose correct page to redirect after error page
 @app.exception_handler(404)
 def not_found(request: Request, exc):
+    # The API clients expect JSON, not the error page
+    if request.url.path.startswith("/api/"):
+        return JSONResponse({"detail": getattr(exc, "detail", "Not Found")}, status_code=status.HTTP_404_NOT_FOUND)
     error = status.HTTP_404_NOT_FOUND
     description = f"Erreur {error} : page non trouvée"
     # Capture l'URL précédente
@@ -90,20 +134,70 @@ def custom_change_mdp_error_redirection(request: Request, exception: ChangeMdpEr
 def health():
     return {"status": "ok"}
 
+# If set, /metrics requires the header "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+@app.get("/metrics")
+def metrics(request: Request):
+    """
+    Metrics of this worker in the Prometheus text format.
+    """
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        return PlainTextResponse("Forbidden", status_code=status.HTTP_403_FORBIDDEN)
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# "verify": only check the schema version (the migrations are applied by the deployment)
+# "migrate": apply the pending migrations at startup (development)
+DB_STARTUP_MODE = os.environ.get("DB_STARTUP_MODE", "verify")
+
+def initialise_database():
+    """
+    Checks (or migrates) the schema, inserts the demo data and fills the dashboard counters.
+    Runs once per deployment: serve.py calls it before starting the workers.
+    """
+    # Outside the try -> the app does not start on a database with another schema
+    if DB_STARTUP_MODE == "migrate":
+        upgrade()
+    else:
+        verify()
+    try:
+        # Demo data, only inserted in an empty database
+        initialiser_db()
+        # The initial data is written without the services -> fill the dashboard counters once
+        if not has_dossier_aggregates():
+            rebuild_dossier_aggregates()
+    except Exception as e:
+        print(f"Startup error: {e}")
+
 @app.on_event("startup")
 def on_application_started():
     print("Good Morning World !")
+    # Every worker samples its own requests
+    profiler.start(app)
+    # Set by serve.py once the database is initialized
+    if os.environ.get("APP_DB_INITIALIZED") != "1":
+        initialise_database()
+    # Only one process runs the background jobs
+    start_background_jobs(start_jobs)
+
+def start_jobs():
     try:
-        create_database()
-        initialiser_db()
+        # Purge of the dossiers past date_suppression_dossier (outside office hours)
+        retention_worker.start()
+        # Reminders before the timeline dates of the dossiers
+        reminder_scheduler.load()
+        reminder_scheduler.start()
     except Exception as e:
         print(f"Startup error: {e}")
 
 @app.on_event("shutdown")
 def shutdown_event():
+    # The data is kept: the next startup only checks the schema version
     try:
-        delete_database()
-        vider_db()
+        stop_background_jobs()
+        profiler.stop()
+        retention_worker.stop()
+        reminder_scheduler.stop()
     except Exception as e:
         print(f"Shutdown error: {e}")
 
@@ -0,0 +1,147 @@
+from collections import OrderedDict
+from threading import Lock
+import hashlib
+import time
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+# Tag used for every fragment that renders dossier data
+DOSSIERS_TAG = "dossiers"
+
+class FragmentCache:
+    """
+    LRU store for pre-rendered HTML fragments.
+    Each entry has a time to live and a set of tags so that a whole group
+    of fragments can be invalidated at once (ex: after a dossier is modified).
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (html, expires_at, tags)
+        self._tags = {}  # tag -> set of keys
+        self._lock = Lock()  # Sync routes are executed in a threadpool
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        """
+        Returns the cached fragment or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            html, expires_at, tags = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            # Mark the entry as recently used
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def set(self, key: str, html: str, ttl: int = None, tags=()):
+        """
+        Stores a fragment. A ttl of None or 0 means no expiration.
+        """
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (html, expires_at, frozenset(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            # Evict the least recently used entries
+            while len(self._entries) > self.maxsize:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+
+    def invalidate_tag(self, tag: str):
+        """
+        Removes every fragment associated with the given tag.
+        """
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key: str):
+        # Must be called with the lock held
+        html, expires_at, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def __len__(self):
+        return len(self._entries)
+
+# Shared by all the template environments of the application
+fragment_cache = FragmentCache()
+
+def fragment_version(*parts) -> str:
+    """
+    Short digest of the row versions a fragment renders, to put in its cache key.
+    Every worker has its own cache and invalidate_tag only clears the one of the worker
+    that wrote: with the versions in the key, the other workers never serve an old fragment.
+
+    Args:
+        *parts: The values identifying the data of the fragment (ex: get_dossiers_versions()).
+
+    Returns:
+        str: The digest.
+    """
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+class FragmentCacheExtension(Extension):
+    """
+    Jinja extension adding a {% cache key, ttl[, tag, ...] %} ... {% endcache %} block.
+    The body is rendered once and then served from the fragment cache until
+    the ttl expires or one of its tags is invalidated.
+    Without explicit tags the fragment is tagged with DOSSIERS_TAG.
+
+    The key must contain the version of the data (see fragment_version): the tags are
+    only invalidated in the worker that wrote.
+
+    Usage:
+        {% cache "en:dossier:" ~ page ~ ":" ~ per_page ~ ":" ~ fragment_version, 300 %}
+            ...
+        {% endcache %}
+    """
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=fragment_cache)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_cache_support", [nodes.List(args)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _cache_support(self, args, caller):
+        key = str(args[0])
+        ttl = args[1] if len(args) > 1 else None
+        tags = args[2:] or (DOSSIERS_TAG,)
+
+        cache = self.environment.fragment_cache
+        html = cache.get(key)
+        if html is None:
+            html = caller()
+            cache.set(key, html, ttl, tags)
+        return Markup(html)
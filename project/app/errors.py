@@ -1,2 +1,8 @@
 class ChangeMdpError(Exception):
     pass
+
+class SchemaVersionError(Exception):
+    pass
+
+class DossierConflictError(Exception):
+    pass
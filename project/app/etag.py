@@ -0,0 +1,44 @@
+import hashlib
+
+from fastapi import Request
+from fastapi.responses import Response
+
+def weak_etag(*parts) -> str:
+    """
+    Builds a weak ETag from the values a page depends on
+    (row versions, connected user, pagination, ...).
+
+    Args:
+        *parts: The values identifying the state of the page.
+
+    Returns:
+        str: The weak ETag, ex: W/"3f2a...".
+    """
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """
+    Checks the If-None-Match header of the request against the ETag.
+    Uses the weak comparison (the W/ prefix is ignored) as required for GET requests.
+
+    Args:
+        request (Request): The incoming request.
+        etag (str): The current ETag of the resource.
+
+    Returns:
+        bool: True if the client already has the current version of the page.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == current for tag in if_none_match.split(","))
+
+def not_modified_response(etag: str) -> Response:
+    """
+    Returns an empty 304 response carrying the ETag.
+    """
+    return Response(status_code=304, headers={"ETag": etag})
@@ -0,0 +1,40 @@
+import importlib
+from threading import Lock
+from types import ModuleType
+
+class LazyModule(ModuleType):
+    """
+    Stands for a heavy module (ex: pandas) and imports it on first attribute access.
+    The workers start without it and only the requests that use it pay the import once.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._module = None
+        self._lock = Lock()  # Sync routes are executed in a threadpool
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self.__name__)
+        return self._module
+
+    def __getattr__(self, attribute: str):
+        # Only called for the attributes that are not set on the proxy
+        return getattr(self._load(), attribute)
+
+    def __dir__(self):
+        return dir(self._load())
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Returns a proxy importing the module on first use.
+
+    Args:
+        name (str): The module name, ex: "pandas".
+
+    Returns:
+        LazyModule: The proxy, used like the module (pd = lazy_import("pandas")).
+    """
+    return LazyModule(name)
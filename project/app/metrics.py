@@ -0,0 +1,261 @@
+"""
+Metrics of the application, exposed by GET /metrics in the Prometheus text format.
+
+The values are kept in memory by each process: with several workers (serve.py) every
+scrape reads the worker that answers, process_info gives its pid.
+"""
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import Lock
+import os
+import time
+
+from jinja2 import Template
+from sqlalchemy import event
+
+from app.cache import fragment_cache
+from app.services.reminders import reminder_scheduler
+from app.services.retention import purge_metrics
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+class Counter:
+    """
+    Counter per label values.
+    """
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = Lock()  # Sync routes are executed in a threadpool
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            values = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labels, key)} {value}" for key, value in values]
+        return lines
+
+class Histogram:
+    """
+    Histogram per label values: only the bucket counts, the sum and the count are kept.
+    """
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}  # label values -> [bucket counts (last one is +Inf), sum]
+        self._lock = Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self) -> list:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _samples(name: str, help: str, values: list, kind: str = "gauge") -> list:
+    # values: [(labels dict, value)], read from the other modules when /metrics is called
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    lines += [f"{name}{_labels(tuple(labels), tuple(labels.values()))} {value}" for labels, value in values]
+    return lines
+
+requests_total = Counter("http_requests_total", "HTTP requests per route and status.", ("method", "route", "status"))
+request_duration = Histogram("http_request_duration_seconds", "HTTP request latency per route.", ("method", "route"))
+request_queries = Histogram("http_request_db_queries", "SQL queries issued per request.", ("route",), QUERY_BUCKETS)
+template_render = Histogram("template_render_seconds", "Jinja2 render time per template.", ("template",))
+request_db_time = Histogram("http_request_db_seconds", "Time spent in SQL queries per request.", ("route",))
+request_n_plus_one = Counter("http_requests_n_plus_one_total", "Requests repeating the same SQL statement (N+1 pattern).", ("route",))
+pool_checkouts = Counter("db_pool_checkouts_total", "Connections taken from the pool.", ("engine",))
+# Rendered by /metrics (the other modules add theirs with register)
+_registry = [requests_total, request_duration, request_queries, request_db_time, request_n_plus_one, template_render, pool_checkouts]
+# Only changed on the event loop -> no lock
+_in_flight = 0
+# name -> engine, for the pool state
+_engines = {}
+
+def register(metric):
+    """
+    Adds a Counter or Histogram to the /metrics page.
+    """
+    _registry.append(metric)
+    return metric
+
+class RequestStats:
+    """
+    What the current request did, filled by the SQLAlchemy events (app/sql_monitor.py).
+    """
+    __slots__ = ("queries", "db_time", "slowest", "statements", "n_plus_one")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        # [(seconds, statement)], slowest first
+        self.slowest = []
+        # statement -> executions, to find the N+1 patterns
+        self.statements = {}
+        self.n_plus_one = []
+
+    def header(self) -> str:
+        # Value of the X-DB-Stats debug header
+        slowest = self.slowest[0][0] * 1000 if self.slowest else 0
+        return f"queries={self.queries}; time={self.db_time * 1000:.1f}ms; slowest={slowest:.1f}ms; n+1={len(self.n_plus_one)}"
+
+# Set by MetricsMiddleware. The object is shared with the threadpool running the sync routes
+current_request: ContextVar = ContextVar("current_request", default=None)
+
+# "1": adds the X-DB-Stats header to the responses and prints the slowest queries of every request
+SQL_DEBUG = os.environ.get("SQL_DEBUG") == "1"
+
+def route_name(scope: dict) -> str:
+    """
+    Returns the path template of the matched route (/fr/dossier/{id}), never the raw path,
+    so the number of label values stays bounded.
+    """
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Mounted apps (/static) only set their root path
+    return scope.get("root_path") or "unmatched"
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting the requests, their latency and their SQL queries per route.
+    Pure ASGI (no BaseHTTPMiddleware) -> a few microseconds per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        global _in_flight
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if SQL_DEBUG:
+                    message.setdefault("headers", []).append((b"x-db-stats", stats.header().encode()))
+            await send(message)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        _in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _in_flight -= 1
+            current_request.reset(token)
+            route = route_name(scope)
+            requests_total.inc(scope["method"], route, status_code)
+            request_duration.observe(elapsed, scope["method"], route)
+            request_queries.observe(stats.queries, route)
+            request_db_time.observe(stats.db_time, route)
+            if stats.n_plus_one:
+                request_n_plus_one.inc(route)
+                for statement in stats.n_plus_one:
+                    print(f"N+1 {scope['method']} {scope['path']}: {stats.statements[statement]} x {' '.join(statement.split())[:300]}")
+            if SQL_DEBUG and stats.queries:
+                print(f"SQL {scope['method']} {scope['path']}: {stats.header()}")
+                for seconds, statement in stats.slowest:
+                    print(f"    {seconds * 1000:8.1f} ms  {' '.join(statement.split())[:300]}")
+
+def instrument_engine(engine, name: str):
+    """
+    Counts the pool checkouts of an engine and shows its pool state in /metrics.
+    """
+    _engines[name] = engine
+
+    # On the engine, not engine.pool -> kept when the pool is replaced (engine.dispose in serve.py)
+    @event.listens_for(engine, "checkout")
+    def count_checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_checkouts.inc(name)
+
+class TimedTemplate(Template):
+    """
+    Template recording its render time (set as template_class of an environment).
+    """
+
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            template_render.observe(time.perf_counter() - start, self.name or "string")
+
+def instrument_templates(*templates):
+    """
+    Records the render time of the templates of Jinja2Templates instances.
+    Must be called before the first template is loaded.
+    """
+    for item in templates:
+        item.env.template_class = TimedTemplate
+
+def render_metrics() -> str:
+    """
+    Builds the /metrics page.
+    """
+    lines = []
+    for metric in list(_registry):
+        lines += metric.render()
+    lines += _samples("http_requests_in_flight", "Requests being processed.", [({}, _in_flight)])
+
+    pools = []
+    for name, engine in _engines.items():
+        pool = engine.pool
+        for stat in ("checkedout", "size", "overflow"):
+            if hasattr(pool, stat):
+                pools.append(({"engine": name, "stat": stat}, getattr(pool, stat)()))
+    lines += _samples("db_pool_connections", "Pool state: connections checked out, pool size, overflow.", pools)
+
+    hits, misses = fragment_cache.hits, fragment_cache.misses
+    lines += _samples("fragment_cache_lookups_total", "Fragment cache lookups.",
+                      [({"result": "hit"}, hits), ({"result": "miss"}, misses)], "counter")
+    lines += _samples("fragment_cache_hit_ratio", "Share of the fragment cache lookups served from the cache.",
+                      [({}, round(hits / (hits + misses), 4) if hits + misses else 0)])
+
+    lines += _samples("retention_purge_total", "Retention purge since the start of the process.",
+                      [({"stat": key}, value) for key, value in purge_metrics.items() if isinstance(value, (int, float))], "counter")
+    lines += _samples("reminders_fired_total", "Reminders sent since the start of the process.", [({}, reminder_scheduler.fired)], "counter")
+    lines += _samples("process_info", "Worker answering the scrape.", [({"pid": os.getpid()}, 1)])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,172 @@
+"""
+Schema migrations of the database.
+
+Every module of app/migrations/versions defines:
+    VERSION (int): the schema version reached by the migration
+    DESCRIPTION (str): what the migration does
+    upgrade(engine): applies the migration
+
+A migration opens its own transactions (engine.begin()) so that backfills can commit batch by
+batch and indexes can be created without a transaction on PostgreSQL. It must be re-runnable:
+if it stops in the middle, running it again finishes it.
+
+Usage (from the project folder):
+    python -m app.migrations.runner upgrade    apply the pending migrations
+    python -m app.migrations.runner status     show the current and latest versions
+    python -m app.migrations.runner verify     fail if the database is not at the latest version
+"""
+import importlib
+import pkgutil
+import sys
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, inspect, select, insert, func, update
+from ..database import engine as default_engine
+from ..errors import SchemaVersionError
+
+# Versions applied to the database (one row per migration)
+schema_metadata = MetaData()
+schema_version = Table(
+    "schema_version", schema_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+def load_migrations() -> list:
+    """
+    Imports the migration modules, ordered by version.
+    """
+    path = Path(__file__).parent / "versions"
+    migrations = [importlib.import_module(f"{__package__}.versions.{module.name}") for module in pkgutil.iter_modules([str(path)])]
+    migrations.sort(key=lambda migration: migration.VERSION)
+    versions = [migration.VERSION for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise SchemaVersionError(f"Duplicate migration versions: {versions}")
+    return migrations
+
+def head_version() -> int:
+    migrations = load_migrations()
+    return migrations[-1].VERSION if migrations else 0
+
+def current_version(engine=None) -> int:
+    """
+    Returns the version of the database (0 for a database without schema_version).
+    """
+    engine = engine or default_engine
+    if not inspect(engine).has_table(schema_version.name):
+        return 0
+    with engine.connect() as connection:
+        return connection.scalar(select(func.max(schema_version.c.version))) or 0
+
+def upgrade(engine=None, target: int = None) -> list:
+    """
+    Applies the pending migrations up to target (default: the latest one).
+
+    Returns:
+        list: The versions applied.
+    """
+    engine = engine or default_engine
+    schema_metadata.create_all(engine)
+    current = current_version(engine)
+    applied = []
+    for migration in load_migrations():
+        if migration.VERSION <= current or (target is not None and migration.VERSION > target):
+            continue
+        print(f"Migration {migration.VERSION}: {migration.DESCRIPTION}")
+        migration.upgrade(engine)
+        with engine.begin() as connection:
+            connection.execute(insert(schema_version).values(
+                version=migration.VERSION, description=migration.DESCRIPTION, applied_at=datetime.now(),
+            ))
+        applied.append(migration.VERSION)
+    return applied
+
+def verify(engine=None) -> int:
+    """
+    Checks that the database is at the latest version, without changing anything.
+    Used at startup instead of creating the tables.
+
+    Returns:
+        int: The version of the database.
+    """
+    current = current_version(engine)
+    head = head_version()
+    if current != head:
+        raise SchemaVersionError(
+            f"Database schema is at version {current}, the application expects {head}: "
+            f"run 'python -m app.migrations.runner upgrade'"
+        )
+    return current
+
+# Helpers for the migrations
+
+def create_index(engine, name: str, table: Table, *columns: str, unique: bool = False):
+    """
+    Creates an index if it does not exist yet.
+    On PostgreSQL the index is built CONCURRENTLY (outside a transaction): the table stays writable.
+    """
+    if name in {index["name"] for index in inspect(engine).get_indexes(table.name)}:
+        return
+    index = Index(name, *(table.c[column] for column in columns), unique=unique, postgresql_concurrently=True)
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            index.create(connection)
+    else:
+        with engine.begin() as connection:
+            index.create(connection)
+
+def add_column(engine, table: Table, column: Column):
+    """
+    Adds a column to an existing table if it does not exist yet.
+    The column must be nullable or have a server default (no table rewrite).
+    """
+    if column.name in {existing["name"] for existing in inspect(engine).get_columns(table.name)}:
+        return
+    column_type = column.type.compile(dialect=engine.dialect)
+    default = f" DEFAULT {column.server_default.arg}" if column.server_default is not None else ""
+    not_null = " NOT NULL" if not column.nullable and default else ""
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            f"ALTER TABLE {preparer.quote(table.name)} ADD COLUMN {preparer.quote(column.name)} {column_type}{default}{not_null}"
+        )
+
+def backfill(engine, table: Table, values: dict, where, batch_size: int = 1000) -> int:
+    """
+    Updates the rows matching where, batch_size rows per transaction, so the table is never locked for long.
+    where must stop matching a row once it is updated.
+
+    Returns:
+        int: The number of rows updated.
+    """
+    key = list(table.primary_key.columns)[0]
+    total = 0
+    while True:
+        with engine.begin() as connection:
+            ids = connection.scalars(select(key).where(where).limit(batch_size)).all()
+            if not ids:
+                return total
+            connection.execute(update(table).where(key.in_(ids)).values(**values))
+            total += len(ids)
+
+def main(argv: list) -> int:
+    command = argv[0] if argv else "status"
+    if command == "upgrade":
+        applied = upgrade()
+        print(f"Applied: {applied}" if applied else "Nothing to apply")
+    elif command == "verify":
+        try:
+            print(f"Schema version {verify()}: up to date")
+        except SchemaVersionError as e:
+            print(e)
+            return 1
+    elif command == "status":
+        print(f"Current version: {current_version()}, latest version: {head_version()}")
+    else:
+        print(__doc__)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,44 @@
+"""
+Stage rules used by the migrations that compute stored stages (v0003, v0007).
+
+Snapshot of services/stages.py: the migrations must compute the same values whenever they run,
+so this module never follows later changes of the services. A new rule needs a new migration
+with its own snapshot.
+"""
+
+# Timeline order of the dates and first step still to come at each stage
+TIMELINE_FIELDS = [
+    "date_cloture", "date_reception", "date_transmission_commission", "date_reunion_commission", "date_entendu",
+    "date_soumission_autorites", "date_transmission_autorites", "date_entree_fonction", "date_suppression_dossier",
+]
+STAGE_PENDING_FROM = {
+    "incomplete": "date_cloture", "complete": "date_transmission_commission",
+    "awaiting_commission": "date_reunion_commission", "commission": "date_reunion_commission",
+    "ranked": "date_soumission_autorites", "authorities": "date_entree_fonction",
+    "hired": "date_suppression_dossier", "not_retained": "date_suppression_dossier",
+}
+
+def stage(row) -> str:
+    # services.stages.compute_stage for a row of details
+    if row.candidature_non_retenue in ("yes", "True", "1", True, 1):
+        return "not_retained"
+    if row.date_entree_fonction:
+        return "hired"
+    if row.date_soumission_autorites or row.date_transmission_autorites:
+        return "authorities"
+    # 0 is the empty ranking field of the older forms: not ranked
+    if row.position_classement:
+        return "ranked"
+    if row.date_reunion_commission or row.date_entendu:
+        return "commission"
+    if row.date_transmission_commission:
+        return "awaiting_commission"
+    if row.dossier_complet:
+        return "complete"
+    return "incomplete"
+
+def stage_columns(row) -> dict:
+    # services.stages.stage_columns: the row must have every column of TIMELINE_FIELDS
+    current = stage(row)
+    fields = TIMELINE_FIELDS[TIMELINE_FIELDS.index(STAGE_PENDING_FROM[current]):]
+    return {"stage": current, "next_deadline": min((getattr(row, field) for field in fields if getattr(row, field) is not None), default=None)}
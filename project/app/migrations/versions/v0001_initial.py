@@ -0,0 +1,63 @@
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table
+
+VERSION = 1
+DESCRIPTION = "Initial tables (users, groups, dossiers and details)"
+
+# Frozen copy of the schema at this version -> later changes of the models do not change this migration
+metadata = MetaData()
+
+users = Table(
+    "users", metadata,
+    Column("id", String(72), primary_key=True),
+    Column("username", String(72), unique=True, nullable=False),
+    Column("name", String(72), nullable=False),
+    Column("surname", String(72), nullable=False),
+    Column("password", String(72), nullable=False),
+    Column("email", String(50), unique=True, nullable=False),
+    Column("group", String(7), nullable=False),
+    Column("whitelist", Boolean, nullable=False),
+    Column("notification", String(255), nullable=False),
+)
+
+for group_table in ("admins", "secretariats", "respRecrutements"):
+    Table(
+        group_table, metadata,
+        Column("id", Integer, primary_key=True),
+        Column("user_id", ForeignKey("users.id", ondelete="CASCADE"), unique=True, nullable=False),
+    )
+
+dossier_candidats = Table(
+    "dossier_candidats", metadata,
+    Column("id", String(72), primary_key=True),
+    Column("username", String(72), nullable=False),
+    Column("name", String(72), nullable=False),
+    Column("mail", String(255), nullable=False),
+    Column("postereference", String(255), nullable=False),
+    Column("profref", String(255), nullable=False),
+    Column("phonenumber", String(15), nullable=False),
+    Column("image", String(255), nullable=False),
+    Column("user_id", ForeignKey("users.id"), nullable=False),
+)
+
+details_dossier_candidats = Table(
+    "details_dossier_candidats", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("dossier_id", ForeignKey("dossier_candidats.id", ondelete="CASCADE"), unique=True, nullable=False),
+    Column("date_cloture", DateTime, nullable=True),
+    Column("date_reception", DateTime, nullable=True),
+    Column("dossier_complet", Boolean, nullable=False),
+    Column("date_transmission_commission", DateTime, nullable=True),
+    Column("date_reunion_commission", DateTime, nullable=True),
+    Column("candidature_non_retenue", String(255), nullable=True),
+    Column("confirmation_information", Boolean, nullable=False),
+    Column("date_entendu", DateTime, nullable=True),
+    Column("position_classement", Integer, nullable=True),
+    Column("date_soumission_autorites", DateTime, nullable=True),
+    Column("date_transmission_autorites", DateTime, nullable=True),
+    Column("date_entree_fonction", DateTime, nullable=True),
+    Column("date_suppression_dossier", DateTime, nullable=True),
+)
+
+def upgrade(engine):
+    # checkfirst -> the databases created before the migrations keep their tables
+    metadata.create_all(engine, checkfirst=True)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, MetaData, String, Table
+from ..runner import add_column, backfill
+
+VERSION = 2
+DESCRIPTION = "Row versions of the dossiers and details (ETags, optimistic locking)"
+
+metadata = MetaData()
+dossier_candidats = Table("dossier_candidats", metadata, Column("id", String(72), primary_key=True), Column("version", Integer))
+details_dossier_candidats = Table("details_dossier_candidats", metadata, Column("id", Integer, primary_key=True), Column("version", Integer))
+
+def upgrade(engine):
+    for table in (dossier_candidats, details_dossier_candidats):
+        add_column(engine, table, Column("version", Integer, nullable=False, server_default="1"))
+        # Rows written before the column existed by older code paths
+        backfill(engine, table, {"version": 1}, table.c.version.is_(None))
@@ -0,0 +1,55 @@
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, UniqueConstraint, select, insert, delete
+from ..runner import create_index
+from ..stages import stage
+
+VERSION = 3
+DESCRIPTION = "Dashboard counters and index on the deletion date"
+
+metadata = MetaData()
+dossier_candidats = Table(
+    "dossier_candidats", metadata,
+    Column("id", String(72), primary_key=True),
+    Column("postereference", String(255)),
+)
+details_dossier_candidats = Table(
+    "details_dossier_candidats", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("dossier_id", String(72)),
+    *(Column(name, DateTime) for name in (
+        "date_entree_fonction", "date_soumission_autorites", "date_transmission_autorites", "date_reunion_commission",
+        "date_entendu", "date_transmission_commission", "date_suppression_dossier",
+    )),
+    Column("candidature_non_retenue", String(255)),
+    Column("position_classement", Integer),
+    Column("dossier_complet", Integer),
+)
+dossier_aggregates = Table(
+    "dossier_aggregates", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("postereference", String(255), nullable=False),
+    Column("stage", String(32), nullable=False),
+    Column("total", Integer, nullable=False, default=0),
+    UniqueConstraint("postereference", "stage"),
+)
+
+def upgrade(engine):
+    create_index(engine, "ix_details_dossier_candidats_date_suppression_dossier", details_dossier_candidats, "date_suppression_dossier")
+    dossier_aggregates.create(engine, checkfirst=True)
+
+    # Backfill of the counters, the dossiers are streamed (not loaded at once)
+    totals = {}
+    with engine.connect() as connection:
+        rows = connection.execution_options(yield_per=1000).execute(
+            select(dossier_candidats.c.postereference, details_dossier_candidats)
+            .outerjoin(details_dossier_candidats, details_dossier_candidats.c.dossier_id == dossier_candidats.c.id)
+        )
+        for row in rows:
+            key = (row.postereference, stage(row) if row.id is not None else "missing_details")
+            totals[key] = totals.get(key, 0) + 1
+    with engine.begin() as connection:
+        connection.execute(delete(dossier_aggregates))
+        if totals:
+            connection.execute(insert(dossier_aggregates), [
+                {"postereference": postereference, "stage": stage, "total": total}
+                for (postereference, stage), total in totals.items()
+            ])
@@ -0,0 +1,36 @@
+from sqlalchemy import Column, DateTime, MetaData, String, Table, select, func
+from ...errors import SchemaVersionError
+from ..runner import create_index
+
+VERSION = 4
+DESCRIPTION = "Idempotency keys and unique (mail, postereference) on the dossiers"
+
+metadata = MetaData()
+dossier_candidats = Table(
+    "dossier_candidats", metadata,
+    Column("id", String(72), primary_key=True),
+    Column("mail", String(255)),
+    Column("postereference", String(255)),
+)
+idempotency_keys = Table(
+    "idempotency_keys", metadata,
+    Column("key", String(72), primary_key=True),
+    Column("user_id", String(72), nullable=False),
+    Column("dossier_id", String(72), nullable=False),
+    Column("created_at", DateTime, nullable=False),
+)
+
+def upgrade(engine):
+    idempotency_keys.create(engine, checkfirst=True)
+    create_index(engine, "ix_idempotency_keys_created_at", idempotency_keys, "created_at")
+
+    # The duplicates must be merged by hand before the unique index can be built
+    with engine.connect() as connection:
+        duplicates = connection.execute(
+            select(dossier_candidats.c.mail, dossier_candidats.c.postereference)
+            .group_by(dossier_candidats.c.mail, dossier_candidats.c.postereference)
+            .having(func.count() > 1)
+        ).all()
+    if duplicates:
+        raise SchemaVersionError(f"Duplicate dossiers (mail, postereference) to merge first: {[tuple(row) for row in duplicates]}")
+    create_index(engine, "uq_dossier_mail_postereference", dossier_candidats, "mail", "postereference", unique=True)
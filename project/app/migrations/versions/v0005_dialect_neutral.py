@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, MetaData, String, Table
+from ..runner import backfill
+
+VERSION = 5
+DESCRIPTION = "Dialect-neutral values: users.group widened, candidature_non_retenue stored as text"
+
+metadata = MetaData()
+users = Table("users", metadata, Column("id", String(72), primary_key=True), Column("group", String(20)))
+details_dossier_candidats = Table(
+    "details_dossier_candidats", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("candidature_non_retenue", String(255)),
+)
+
+def upgrade(engine):
+    # SQLite does not check the length of VARCHAR, PostgreSQL refuses "respRecrutement" in VARCHAR(7)
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as connection:
+            connection.exec_driver_sql('ALTER TABLE users ALTER COLUMN "group" TYPE VARCHAR(20)')
+
+    # Booleans written by the older code paths -> values of the forms
+    column = details_dossier_candidats.c.candidature_non_retenue
+    backfill(engine, details_dossier_candidats, {"candidature_non_retenue": "yes"}, column.in_(["1", "True", "true"]))
+    backfill(engine, details_dossier_candidats, {"candidature_non_retenue": "no"}, column.in_(["0", "False", "false"]))
@@ -0,0 +1,17 @@
+from sqlalchemy import Boolean, Column, MetaData, String, Table
+from ..runner import create_index
+
+VERSION = 6
+DESCRIPTION = "Indexes on users.group and users.whitelist (filters of the admin user list)"
+
+metadata = MetaData()
+users = Table(
+    "users", metadata,
+    Column("id", String(72), primary_key=True),
+    Column("group", String(20)),
+    Column("whitelist", Boolean),
+)
+
+def upgrade(engine):
+    create_index(engine, "ix_users_group", users, "group")
+    create_index(engine, "ix_users_whitelist", users, "whitelist")
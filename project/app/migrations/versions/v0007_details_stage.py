@@ -0,0 +1,42 @@
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, bindparam, select, update
+from ..runner import add_column, create_index
+from ..stages import stage_columns
+
+VERSION = 7
+DESCRIPTION = "Stage and next deadline stored in details_dossier_candidats"
+
+metadata = MetaData()
+details_dossier_candidats = Table(
+    "details_dossier_candidats", metadata,
+    Column("id", Integer, primary_key=True),
+    *(Column(name, DateTime) for name in (
+        "date_cloture", "date_reception", "date_transmission_commission", "date_reunion_commission", "date_entendu",
+        "date_soumission_autorites", "date_transmission_autorites", "date_entree_fonction", "date_suppression_dossier",
+    )),
+    Column("candidature_non_retenue", String(255)),
+    Column("position_classement", Integer),
+    Column("dossier_complet", Integer),
+    Column("stage", String(32)),
+    Column("next_deadline", DateTime),
+)
+
+def upgrade(engine, batch_size: int = 1000):
+    table = details_dossier_candidats
+    add_column(engine, table, table.c.stage)
+    add_column(engine, table, table.c.next_deadline)
+
+    # The values are computed in Python, batch_size rows per transaction
+    statement = update(table).where(table.c.id == bindparam("_id")).values(
+        stage=bindparam("_stage"), next_deadline=bindparam("_next_deadline"),
+    )
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(select(table).where(table.c.stage.is_(None)).limit(batch_size)).all()
+            if not rows:
+                break
+            connection.execute(statement, [
+                {"_id": row.id, **{f"_{key}": value for key, value in stage_columns(row).items()}} for row in rows
+            ])
+
+    create_index(engine, "ix_details_dossier_candidats_stage", table, "stage")
+    create_index(engine, "ix_details_dossier_candidats_next_deadline", table, "next_deadline")
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, UniqueConstraint
+from ..runner import add_column, create_index
+
+VERSION = 8
+DESCRIPTION = "Date of the last write of the details and reminders of the users"
+
+metadata = MetaData()
+details_dossier_candidats = Table(
+    "details_dossier_candidats", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("updated_at", DateTime),
+)
+reminders = Table(
+    "reminders", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", String(72), nullable=False, index=True),
+    Column("dossier_id", String(72), nullable=False),
+    Column("field", String(32), nullable=False),
+    Column("date", DateTime, nullable=False),
+    UniqueConstraint("dossier_id", "field", "date"),
+)
+
+def upgrade(engine):
+    # No backfill: the rows written before are read by the full load of the scheduler at startup
+    add_column(engine, details_dossier_candidats, details_dossier_candidats.c.updated_at)
+    create_index(engine, "ix_details_dossier_candidats_updated_at", details_dossier_candidats, "updated_at")
+    reminders.create(engine, checkfirst=True)
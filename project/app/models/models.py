@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import DateTime, Table, Column, String, Integer, ForeignKey, Float, Boolean
+from sqlalchemy import DateTime, Table, Column, String, Integer, ForeignKey, Float, Boolean, UniqueConstraint, Index, literal_column
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -32,8 +32,8 @@ class Users(Base):
     surname: Mapped[str] = mapped_column(String(72))
     password: Mapped[str] = mapped_column(String(72))
     email: Mapped[str] = mapped_column(String(50), unique=True)
-    group: Mapped[str] = mapped_column(String(7))
-    whitelist: Mapped[bool] = mapped_column(Boolean)
+    group: Mapped[str] = mapped_column(String(20), index=True)  # "respRecrutement" does not fit in 7 (enforced by PostgreSQL)
+    whitelist: Mapped[bool] = mapped_column(Boolean, index=True)
     notification: Mapped[str] = mapped_column(String(255), default="")
 
     admin: Mapped["Admins"] = relationship("Admins", back_populates="user")
@@ -53,10 +53,16 @@ class DossierCandidats(Base):
     phonenumber: Mapped[str] = mapped_column(String(15), nullable=False)
     image: Mapped[str] = mapped_column(String(255))
     user_id: Mapped[str] = mapped_column(ForeignKey("users.id"), nullable=False)
+    # Row version, bumped by every UPDATE of the row (used for ETags)
+    # No version_id_col: the ORM would raise StaleDataError on concurrent saves, the last save wins as before
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, onupdate=literal_column("version") + 1)
     
     details: Mapped["DetailsDossierCandidats"] = relationship("DetailsDossierCandidats", back_populates="dossier", uselist=False, cascade="all, delete-orphan", lazy="joined")
     user: Mapped["Users"] = relationship("Users", back_populates="dossiers")
 
+    #One dossier per candidate and position -> a double submit can not create a duplicate
+    __table_args__ = (Index("uq_dossier_mail_postereference", "mail", "postereference", unique=True),)
+
 
 class DetailsDossierCandidats(Base):
     __tablename__ = 'details_dossier_candidats'
@@ -77,4 +83,50 @@ class DetailsDossierCandidats(Base):
     date_soumission_autorites: Mapped[datetime] = mapped_column(DateTime, nullable=True)
     date_transmission_autorites: Mapped[datetime] = mapped_column(DateTime, nullable=True)
     date_entree_fonction: Mapped[datetime] = mapped_column(DateTime, nullable=True)
-    date_suppression_dossier: Mapped[datetime] = mapped_column(DateTime, nullable=True)
\ No newline at end of file
+    date_suppression_dossier: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True)
+    #Derived from the columns above on every write (see services/stages.py) -> stage filters without computing in Python
+    stage: Mapped[str] = mapped_column(String(32), nullable=True, index=True)
+    next_deadline: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True)
+    #Date of the last write -> the reminder scheduler only reads again the rows written since its last read
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True, default=datetime.now, onupdate=datetime.now)
+    # Row version, bumped by every UPDATE of the row (used for ETags)
+    # No version_id_col: the ORM would raise StaleDataError on concurrent saves, the last save wins as before
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, onupdate=literal_column("version") + 1)
+
+
+#Number of dossiers per position reference and per pipeline stage
+#Maintained by the services on every dossier write -> the dashboard never scans the dossiers
+class DossierAggregates(Base):
+    __tablename__ = 'dossier_aggregates'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    postereference: Mapped[str] = mapped_column(String(255), nullable=False)
+    stage: Mapped[str] = mapped_column(String(32), nullable=False)
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    __table_args__ = (UniqueConstraint("postereference", "stage"),)
+
+
+#Key sent with a create form -> a retry of the same submit returns the dossier created the first time
+class IdempotencyKeys(Base):
+    __tablename__ = 'idempotency_keys'
+
+    key: Mapped[str] = mapped_column(String(72), primary_key=True)
+    user_id: Mapped[str] = mapped_column(String(72), nullable=False)
+    dossier_id: Mapped[str] = mapped_column(String(72), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.now, index=True)
+
+
+#Reminder sent by the scheduler before a timeline date of a dossier (services/reminders.py)
+#Stored apart from Users.notification -> the message of the staff is kept, the label is translated by the page
+class Reminders(Base):
+    __tablename__ = 'reminders'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[str] = mapped_column(String(72), nullable=False, index=True)
+    dossier_id: Mapped[str] = mapped_column(String(72), nullable=False)
+    field: Mapped[str] = mapped_column(String(32), nullable=False)
+    date: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    #A reminder sent again (handover of the background jobs between workers) is stored once
+    __table_args__ = (UniqueConstraint("dossier_id", "field", "date"),)
@@ -0,0 +1,251 @@
+"""
+Sampling profiler of the routes.
+
+Every sample reads the stacks of the threads (sys._current_frames) and keeps the ones running a
+route endpoint, cut at the endpoint frame: the samples tell where the time of a page goes
+(SQL, Jinja, pandas, ...) without slowing down the code being profiled.
+
+- Continuous: a thread samples every PROFILE_SAMPLE_INTERVAL seconds and aggregates the stacks
+  per route, downloadable in the folded format of the flame graphs (/fr/admin/profiles).
+- Per request: an admin adds ?profile=1 (or the header X-Profile: 1) to a page, the request is
+  sampled every millisecond and the answer is the profile instead of the page. Only GET and HEAD
+  requests are profiled: the request is executed, the answer of a form would be lost after its writes.
+"""
+from collections import Counter as Tally
+from pathlib import Path
+from threading import Event, Lock, Thread
+from urllib.parse import parse_qs
+import os
+import sys
+import threading
+import time
+
+from starlette.requests import Request
+
+from app.login_manager import login_manager
+from app.metrics import current_request
+
+# Seconds between two samples of the continuous profiler (0 -> disabled)
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", 0.1))
+# Seconds between two samples of a profiled request
+PROFILE_REQUEST_INTERVAL = 0.001
+# Distinct stacks kept by the continuous profiler, the next ones are counted as [other]
+MAX_STACKS = 10000
+
+_ROOT = str(Path(__file__).resolve().parent.parent) + os.sep
+_labels = {}
+
+def frame_label(code) -> str:
+    """
+    Short name of a function for the folded stacks: app/services/folder.py:get_dossier_rows.
+    """
+    label = _labels.get(code)
+    if label is None:
+        filename = code.co_filename
+        if filename.startswith(_ROOT):
+            filename = filename[len(_ROOT):]
+        elif "site-packages" + os.sep in filename:
+            filename = filename.split("site-packages" + os.sep, 1)[1]
+        label = _labels[code] = f"{filename}:{code.co_name}"
+    return label
+
+def route_endpoints(app) -> dict:
+    """
+    Returns {code of the endpoint function: route path} for the routes of the app.
+    """
+    endpoints = {}
+    for route in app.routes:
+        endpoint = getattr(route, "endpoint", None)
+        code = getattr(endpoint, "__code__", None)
+        if code is not None and hasattr(route, "path"):
+            endpoints[code] = route.path
+    return endpoints
+
+def sample_stacks(endpoints: dict, skip: int) -> list:
+    """
+    Reads the stacks of the threads running an endpoint.
+
+    Returns:
+        list: [(endpoint code, labels from the endpoint to the running function)]
+    """
+    stacks = []
+    for thread_id, frame in sys._current_frames().items():
+        if thread_id == skip:
+            continue
+        codes = []
+        while frame is not None:
+            code = frame.f_code
+            codes.append(code)
+            if code in endpoints:
+                stacks.append((code, tuple(frame_label(item) for item in reversed(codes))))
+                break
+            frame = frame.f_back
+    return stacks
+
+class Profiler:
+    """
+    Continuous low-rate sampler aggregating the stacks per route.
+    """
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self._endpoints = {}
+        self._stacks = {}  # route -> {stack: samples}
+        self._distinct = 0
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+
+    def start(self, app):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._endpoints = route_endpoints(app)
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stacks = sample_stacks(self._endpoints, own)
+            with self._lock:
+                self.samples += 1
+                for code, labels in stacks:
+                    route = self._stacks.setdefault(self._endpoints[code], {})
+                    if labels not in route:
+                        if self._distinct >= MAX_STACKS:
+                            labels = ("[other]",)
+                        else:
+                            self._distinct += 1
+                    route[labels] = route.get(labels, 0) + 1
+
+    def routes(self) -> list:
+        """
+        Returns:
+            list: [(route, samples)], the busiest routes first.
+        """
+        with self._lock:
+            totals = [(route, sum(stacks.values())) for route, stacks in self._stacks.items()]
+        return sorted(totals, key=lambda item: item[1], reverse=True)
+
+    def folded(self, route: str = None) -> str:
+        """
+        Stacks in the folded format ("route;frame;frame samples" per line), for flamegraph.pl or speedscope.
+
+        Args:
+            route (str): Only this route (default: all the routes).
+        """
+        with self._lock:
+            items = [(name, dict(stacks)) for name, stacks in self._stacks.items() if route is None or name == route]
+        return "".join(
+            f"{';'.join((name,) + labels)} {count}\n"
+            for name, stacks in items
+            for labels, count in sorted(stacks.items(), key=lambda item: item[1], reverse=True)
+        )
+
+    def reset(self):
+        with self._lock:
+            self._stacks = {}
+            self._distinct = 0
+
+profiler = Profiler()
+
+class RequestProfile:
+    """
+    Samples the threads every PROFILE_REQUEST_INTERVAL while one request runs.
+    """
+
+    def __init__(self, endpoints: dict):
+        self.endpoints = endpoints
+        self.stacks = []
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(PROFILE_REQUEST_INTERVAL):
+            self.stacks += sample_stacks(self.endpoints, own)
+
+    def report(self, route: str, stats=None, top: int = 25) -> str:
+        """
+        Text report: time per function (self and total) then the folded stacks.
+        Only the samples of the endpoint of the route are kept (other requests served meanwhile are ignored).
+        """
+        stacks = [labels for code, labels in self.stacks if self.endpoints[code] == route]
+        total = len(stacks) or 1
+        own = Tally(labels[-1] for labels in stacks)
+        inclusive = Tally(label for labels in stacks for label in set(labels))
+        lines = [f"Route: {route}", f"Wall time: {self.elapsed * 1000:.1f} ms", f"Samples: {len(stacks)} (every {PROFILE_REQUEST_INTERVAL * 1000:g} ms)"]
+        if stats is not None:
+            lines.append(f"SQL: {stats.header()}")
+        lines += ["", "Self time:"]
+        lines += [f"  {count * 100 / total:5.1f}%  {label}" for label, count in own.most_common(top)]
+        lines += ["", "Total time:"]
+        lines += [f"  {count * 100 / total:5.1f}%  {label}" for label, count in inclusive.most_common(top)]
+        lines += ["", "Folded stacks:"]
+        lines += [f"{';'.join((route,) + labels)} {count}" for labels, count in Tally(stacks).most_common()]
+        return "\n".join(lines) + "\n"
+
+# Methods without side effects, the only ones profiled on demand
+PROFILED_METHODS = ("GET", "HEAD")
+
+def profile_requested(scope: dict) -> bool:
+    # ?profile=1 or X-Profile: 1, ignored on POST/PATCH/DELETE (the request runs normally)
+    if scope.get("method") not in PROFILED_METHODS:
+        return False
+    if parse_qs(scope.get("query_string", b"").decode()).get("profile") == ["1"]:
+        return True
+    return (b"x-profile", b"1") in scope.get("headers", [])
+
+class ProfilerMiddleware:
+    """
+    Answers the profile of the request instead of the page when an admin asks for it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._endpoints = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profile_requested(scope):
+            await self.app(scope, receive, send)
+            return
+        user = await login_manager.optional(Request(scope))
+        if user is None or user.group != "admin":
+            await self.app(scope, receive, send)
+            return
+        if self._endpoints is None:
+            self._endpoints = route_endpoints(scope["app"])
+
+        async def discard(message):
+            # The page is replaced by the profile
+            pass
+
+        with RequestProfile(self._endpoints) as profile:
+            await self.app(scope, receive, discard)
+        route = scope.get("route")
+        if route is None:
+            body = b"No route matched: nothing to profile\n"
+        else:
+            body = profile.report(route.path, current_request.get()).encode()
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/plain; charset=utf-8"), (b"content-length", str(len(body)).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,128 @@
+from typing import Annotated, Optional
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Form
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from ...login_manager import login_manager
+from ...schemas.users import UserSchema
+from ...schemas.folder import DossierBatchGet, DossierBatchPatch, DetailsBatchUpdate
+from ...services.folder import get_dossier_records, patch_dossiers, update_details_batch, DOSSIER_FIELDS, DETAILS_FIELDS
+from ...services.users import get_user_by_email
+import hashlib
+
+# orjson serializes the rows (and their datetimes) several times faster than json
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse
+except ImportError:
+    ORJSONResponse = None
+
+# Versioned JSON API -> the machine clients use it instead of the HTML pages
+api_router = APIRouter(prefix="/api/v1", tags=["api"])
+
+MAX_LIMIT = 500
+
+def api_response(content, status_code: int = status.HTTP_200_OK):
+    if ORJSONResponse is not None:
+        return ORJSONResponse(content, status_code=status_code)
+    return JSONResponse(jsonable_encoder(content), status_code=status_code)
+
+def staff_user(user: UserSchema = Depends(login_manager)) -> UserSchema:
+    # The token is read from the auth cookie or from the "Authorization: Bearer" header
+    if user.group == 'candidat' or not user.whitelist:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access reserved to the staff")
+    return user
+
+def parse_fields(fields: Optional[str]) -> tuple:
+    """
+    Parses a sparse fieldset: "id,name,details.date_cloture" or "id,details" for all the details.
+
+    Returns:
+        tuple: (dossier fields or None for all, details fields or None for no details)
+        The dossier fields are None only without fieldset, "details.date_cloture" alone returns the id only.
+    """
+    if not fields:
+        return None, None
+    dossier_fields = []
+    details_fields = None
+    for field in (field.strip() for field in fields.split(",")):
+        if field == "details":
+            details_fields = list(DETAILS_FIELDS)
+        elif field.startswith("details."):
+            if field[8:] not in DETAILS_FIELDS:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown field: {field}")
+            if details_fields is None:
+                details_fields = []
+            if field[8:] not in details_fields:
+                details_fields.append(field[8:])
+        elif field in DOSSIER_FIELDS:
+            dossier_fields.append(field)
+        elif field:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown field: {field}")
+    return dossier_fields, details_fields
+
+@api_router.post("/token")
+def api_token(email: Annotated[str, Form()], password: Annotated[str, Form()]):
+    """
+    Returns an access token to send in the "Authorization: Bearer" header.
+    """
+    user = get_user_by_email(email)
+    hashed_password = hashlib.sha3_256(password.encode()).hexdigest()
+    if user is None or user.password != hashed_password:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
+    if not user.whitelist:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User blocked")
+    access_token = login_manager.create_access_token(data={'sub': user.id})
+    return api_response({"access_token": access_token, "token_type": "bearer"})
+
+@api_router.get("/dossiers")
+def api_list_dossiers(
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_LIMIT),
+    mail: Optional[str] = None,
+    user: UserSchema = Depends(staff_user),
+):
+    """
+    Lists the dossiers ordered by id.
+    The next page is requested with cursor=next_cursor, next_cursor is None on the last page.
+    """
+    dossier_fields, details_fields = parse_fields(fields)
+    # One more row than asked -> tells if there is a next page without counting
+    records = get_dossier_records(dossier_fields, details_fields, after=cursor, limit=limit + 1, mail=mail)
+    next_cursor = records[limit - 1]["id"] if len(records) > limit else None
+    return api_response({"data": records[:limit], "next_cursor": next_cursor})
+
+@api_router.get("/dossiers/{dossier_id}")
+def api_get_dossier(dossier_id: str, fields: Optional[str] = None, user: UserSchema = Depends(staff_user)):
+    dossier_fields, details_fields = parse_fields(fields or ",".join([*DOSSIER_FIELDS, "details"]))
+    records = get_dossier_records(dossier_fields, details_fields, ids=[dossier_id])
+    if not records:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dossier not found")
+    return api_response(records[0])
+
+@api_router.post("/dossiers/batch")
+def api_batch_get_dossiers(body: DossierBatchGet, user: UserSchema = Depends(staff_user)):
+    """
+    Returns many dossiers in one query, the missing ids are listed in 'not_found'.
+    """
+    dossier_fields, details_fields = parse_fields(body.fields)
+    records = get_dossier_records(dossier_fields, details_fields, ids=body.ids)
+    found = {record["id"] for record in records}
+    return api_response({"data": records, "not_found": [id for id in body.ids if id not in found]})
+
+@api_router.patch("/dossiers")
+def api_batch_patch_dossiers(body: DossierBatchPatch, user: UserSchema = Depends(staff_user)):
+    """
+    Updates many dossiers in one transaction.
+    Returns {dossier_id: 'updated' | 'not_found' | 'invalid' | 'conflict'} ('conflict': the new mail and position reference are already used, nothing is written).
+    """
+    return api_response({"results": patch_dossiers(body.items)})
+
+@api_router.patch("/dossiers/details")
+def api_batch_update_details(body: DetailsBatchUpdate, user: UserSchema = Depends(staff_user)):
+    """
+    Updates the details of many dossiers in one transaction (ex: after a committee meeting).
+    Every row is validated first, the invalid ones are skipped and explained in 'errors'.
+    """
+    results, errors = update_details_batch(body.items)
+    return api_response({"results": results, "errors": errors})
@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Request
 from fastapi.templating import Jinja2Templates
-from ...services.users import add_user, get_all_users, get_user_by_id, set_user_group, set_user_whitelist, get_user_by_email, change_user_password
+from ...services.users import add_user, get_user_by_id, set_user_group, set_user_whitelist, get_user_by_email, change_user_password
 from fastapi import status, Depends, Form
 from ...login_manager import login_manager
 from fastapi.responses import RedirectResponse
 from ...schemas.users import UserSchema
+from ...metrics import instrument_templates
 from typing import Annotated
 from uuid import uuid4
 import hashlib
@@ -15,6 +16,8 @@ user_router = APIRouter()
 # Setup Jinja2Templates for HTML rendering
 templatesfr = Jinja2Templates(directory="templates/fr")
 templatesen = Jinja2Templates(directory="templates/en")
+# Render time per template in /metrics
+instrument_templates(templatesfr, templatesen)
 
 # Route for user login page
 @user_router.get("/en/login")
@@ -181,9 +184,8 @@ def administration(request: Request, user: UserSchema = Depends(login_manager)):
         description = f"Error {error}: User blocked."
         return RedirectResponse(url=f"/error/{description}/en/login", status_code=302)
     
-    # Get all users for administration
-    users = get_all_users()
-    return templatesen.TemplateResponse(
-        "administration.html", 
-        context={'request': request, 'users': users}
-    )
\ No newline at end of file
+    # The user list is paginated by the admin page (filters and sort in the query string)
+    url = "/en/admin/users"
+    if request.url.query:
+        url += f"?{request.url.query}"
+    return RedirectResponse(url=url, status_code=302)
\ No newline at end of file
@@ -1,20 +1,33 @@
 from datetime import datetime
 from multiprocessing.resource_tracker import getfd
 from pathlib import Path
-from typing import Annotated, Optional
+from typing import Annotated, List, Optional
+from urllib.parse import urlencode
 from uuid import uuid4
 from fastapi import APIRouter, HTTPException, status, Request, Depends, Query, Form, File, UploadFile
 from app.database import Session
-from app.services.users import update_user_profile
+from app.services.users import update_user_profile, get_users_page, get_user_groups, set_users_group, set_users_whitelist, user_filters, USERS_MAX_PER_PAGE
 from ...login_manager import login_manager
 from ...schemas.users import UserSchema
-from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from ...models.models import DetailsDossierCandidats, DossierCandidats, Users
-from app.services.folder import add_details_dossier_candidat, add_dossier_candidat, delete_candidat, get_dossier_by_id, get_details_dossier_by_id, get_dossiers_by_candidat, update_dossier, update_dossier_details, search_dossiers
+from app.services.folder import add_details_dossier_candidat, add_dossier_candidat, delete_candidat, get_dossier_by_id, get_details_dossier_by_id, get_dossiers_by_candidat, update_dossier, update_dossier_details, search_dossiers, get_dossier_version, get_dossiers_versions, get_dossier_view, set_dossier_owner_notification, get_dossier_rows, has_dossiers_missing_details, count_dossiers, iter_dossier_export_rows, get_candidate_home
 from sqlalchemy.orm import joinedload
-import pandas as pd
+from app.cache import FragmentCacheExtension, fragment_version
+from app.etag import weak_etag, is_not_modified, not_modified_response
+from app.services.dashboard import get_dossier_dashboard
+from app.services.stages import STAGES, STAGE_LABELS
+from app.services.reminders import REMINDER_LABELS, get_user_reminders
+from app.lazy import lazy_import
+from app.metrics import instrument_templates
+from app.profiler import profiler
+from app.errors import DossierConflictError
 import io
+import os
+
+# Only the Excel export needs pandas -> imported on the first export, not at startup
+pd = lazy_import("pandas")
 
 # Create APIRouter instance for routes
 router = APIRouter()
@@ -22,6 +35,17 @@ router = APIRouter()
 # Setup Jinja2templatesfr for HTML rendering
 templatesfr = Jinja2Templates(directory="templates/fr")
 templatesen = Jinja2Templates(directory="templates/en")
+# Enable the {% cache %} tag for expensive template sections
+templatesfr.env.add_extension(FragmentCacheExtension)
+templatesen.env.add_extension(FragmentCacheExtension)
+# Labels of the pipeline stages
+templatesfr.env.globals["stage_labels"] = STAGE_LABELS["fr"]
+templatesen.env.globals["stage_labels"] = STAGE_LABELS["en"]
+# Labels of the reminders
+templatesfr.env.globals["reminder_labels"] = REMINDER_LABELS["fr"]
+templatesen.env.globals["reminder_labels"] = REMINDER_LABELS["en"]
+# Render time per template in /metrics
+instrument_templates(templatesfr, templatesen)
 
 # Route for redirecting to the French version of the site
 @router.get("/")
@@ -81,14 +105,20 @@ def list_mainpage(request: Request, user: UserSchema = Depends(login_manager.opt
     if user and user.group == 'candidat':
         return RedirectResponse(url="/fr/accueil", status_code=302)
     
-    session = Session()
-    candidats = session.query(DossierCandidats).all()  # Retrieve all candidate files
-    has_missing_details = any(candidat.details is None for candidat in candidats)
-    session.close()
+    # Answer 304 before querying the dossiers if none of the displayed ones changed
+    versions = get_dossiers_versions(1, 5)
+    has_missing_details = has_dossiers_missing_details()
+    etag = weak_etag("mainpage", user.id, user.group, versions, has_missing_details)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    # Only the 5 most recent files are displayed
+    candidats = get_dossier_rows(per_page=5)
 
     return templatesfr.TemplateResponse(
         "mainpage.html",
-        context={'request': request, 'current_user': user, 'group': user.group, 'candidats': candidats , 'has_missing_details': has_missing_details}
+        context={'request': request, 'current_user': user, 'group': user.group, 'candidats': candidats , 'has_missing_details': has_missing_details, 'fragment_version': fragment_version(versions)},
+        headers={'ETag': etag}
     )
 
 # Route for the main page for candidates
@@ -101,13 +131,9 @@ def mainpage_candidat(request: Request, user: UserSchema = Depends(login_manager
     if user is None:
         return RedirectResponse(url="/fr/login", status_code=302)
     
-    session = Session()
-
-    # Retrieve files linked to the user
-    dossiers = session.query(DossierCandidats).filter(DossierCandidats.mail == user.email).all()
-    has_missing_details = any(candidat.details is None for candidat in dossiers)
-
-    session.close()
+    # Files linked to the user (only the 3 most recent are displayed), their stage, the counts and the notification in one query
+    home = get_candidate_home(user.id, user.email, per_page=3)
+    reminders = get_user_reminders(user.id)
 
     return templatesfr.TemplateResponse(
         "mainpage_candidat.html",
@@ -115,26 +141,37 @@ def mainpage_candidat(request: Request, user: UserSchema = Depends(login_manager
             'request': request,
             'current_user': user,
             'group': user.group,
-            'dossiers': dossiers,
-            'has_missing_details': has_missing_details,
+            'dossiers': home.dossiers,
+            'stages': home.stages,
+            'total_dossiers': home.total,
+            'has_missing_details': home.missing_details > 0,
+            'notifications': home.notification,
+            'reminders': reminders,
         }
     )
 
 # Route for listing all candidate files
 @router.get("/fr/dossier")
-def list_mainpage(request: Request, user: UserSchema = Depends(login_manager.optional), page: int = Query(1, ge=1), per_page: int = Query(10, ge=1)):
+def list_mainpage(request: Request, user: UserSchema = Depends(login_manager.optional), page: int = Query(1, ge=1), per_page: int = Query(10, ge=1), stage: Optional[str] = Query(None)):
     """
     Displays a paginated list of all candidate files.
+    Optionally only the files at one stage of the pipeline (stage column of the details).
     Redirects candidates to their specific dossier page.
     """
     if user.group == 'candidat':
         return RedirectResponse(url="/fr/dossiercandidat", status_code=302)
+    if stage not in STAGES:
+        stage = None
     
-    session = Session()
-    total_candidats = session.query(DossierCandidats).count()
-    candidats = session.query(DossierCandidats).options(joinedload(DossierCandidats.details)).offset((page - 1) * per_page).limit(per_page).all()
-    has_missing_details = any(candidat.details is None for candidat in candidats)
-    session.close()
+    # Answer 304 before querying the dossiers if none of the page changed
+    versions = get_dossiers_versions(page, per_page, stage=stage)
+    etag = weak_etag("dossier", user.id, user.group, page, per_page, stage, versions)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    total_candidats = count_dossiers(stage=stage)
+    candidats = get_dossier_rows(page, per_page, stage=stage)
+    has_missing_details = any(not candidat.details for candidat in candidats)
 
     return templatesfr.TemplateResponse(
         "dossier.html",
@@ -146,8 +183,12 @@ def list_mainpage(request: Request, user: UserSchema = Depends(login_manager.opt
             'page': page,
             'per_page': per_page,
             'total_candidats': total_candidats,
-            'has_missing_details': has_missing_details
-        }
+            'has_missing_details': has_missing_details,
+            'stage': stage,
+            'stages': STAGES,
+            'fragment_version': fragment_version(versions)
+        },
+        headers={'ETag': etag}
     )
 
 # Route for listing candidate-specific files
@@ -160,24 +201,30 @@ def list_dossiers_candidat(request: Request, user: UserSchema = Depends(login_ma
     if user is None:
         return RedirectResponse(url="/fr/login", status_code=302)
     
-    session = Session()
-    total_dossiers = session.query(DossierCandidats).filter(DossierCandidats.mail == user.email).count()
-    dossiers = session.query(DossierCandidats).options(joinedload(DossierCandidats.details)).filter(DossierCandidats.mail == user.email).offset((page - 1) * per_page).limit(per_page).all()
-    has_missing_details = any(dossier.details is None for dossier in dossiers)
-    session.close()
+    # Answer 304 before querying the dossiers if none of the page changed
+    reminders = get_user_reminders(user.id)
+    etag = weak_etag("dossiercandidat", user.id, user.notification, reminders, page, per_page, get_dossiers_versions(page, per_page, mail=user.email))
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    # The page, the total and the notification in one query
+    home = get_candidate_home(user.id, user.email, page, per_page)
+    has_missing_details = any(not dossier.details for dossier in home.dossiers)
     
     return templatesfr.TemplateResponse(
         "dossiercandidat.html",
         context={
             'request': request,
             'current_user': user,
-            'dossiers': dossiers,
+            'dossiers': home.dossiers,
             'page': page,
             'per_page': per_page,
-            'total_candidats': total_dossiers,
+            'total_candidats': home.total,
             'has_missing_details': has_missing_details,
-            'notifications': user.notification
-        }
+            'notifications': home.notification,
+            'reminders': reminders
+        },
+        headers={'ETag': etag}
     )
 
 
@@ -216,19 +263,24 @@ def show_dossier_details(request: Request, id: str, user: UserSchema = Depends(l
     Displays the details of a specific dossier.
     Redirects to the add details page if no details are associated with the dossier.
     """
+    # Answer 304 before loading the dossier if it did not change
+    # (the date is part of the ETag because the timeline depends on it)
+    now = datetime.now()
+    etag = weak_etag("dossier_detail", id, user.id, user.group, now.date(), get_dossier_version(id))
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
 
-
-    dossier, has_missing_details = get_dossier_by_id(id)
-    details = get_details_dossier_by_id(id)
-
+    # Dossier, details and owner are loaded in a single query
+    dossier = get_dossier_view(id)
     
     if not dossier:
         return {"error": "Dossier not found"}
     
-    if not details:
+    details = dossier.details
+    has_missing_details = details is None
+    if has_missing_details:
         return RedirectResponse(url=f"/fr/details/add/{id}", status_code=302)
     
-    now = datetime.now()
     timeline_dates = [
         {"label": "Date de clôture", "date": details.date_cloture},
         {"label": "Date de réception", "date": details.date_reception},
@@ -258,7 +310,27 @@ def show_dossier_details(request: Request, id: str, user: UserSchema = Depends(l
             'has_missing_details': has_missing_details,
             'now': now,
             'timeline_dates': timeline_dates,
-        }
+        },
+        headers={'ETag': etag}
+    )
+
+@router.get("/fr/dashboard")
+def dashboard(request: Request, user: UserSchema = Depends(login_manager.optional)):
+    """
+    Displays the number of dossiers per stage and per position reference.
+    Redirects candidates to their homepage.
+    """
+    if user is None:
+        return RedirectResponse(url="/fr/login", status_code=302)
+    if user.group == 'candidat':
+        return RedirectResponse(url="/fr/accueil", status_code=302)
+
+    # Read from the aggregates table -> does not depend on the number of dossiers
+    overview = get_dossier_dashboard()
+
+    return templatesfr.TemplateResponse(
+        "dashboard.html",
+        context={'request': request, 'current_user': user, 'group': user.group, 'overview': overview, 'stages': STAGES}
     )
 
 @router.get("/fr/profile")
@@ -297,12 +369,13 @@ def get_modify_detail_form(request: Request, id: str, user: UserSchema = Depends
     if user and user.group == 'candidat':
         return RedirectResponse(url="/fr/accueil", status_code=302)
     
-    dossier = get_dossier_by_id(id)
-    details = get_details_dossier_by_id(id)
+    dossier = get_dossier_view(id)
+    if not dossier:
+        raise HTTPException(status_code=404, detail="Dossier not found")
 
     return templatesfr.TemplateResponse(
         "modify_detail.html",
-        context={"request": request, "dossier": dossier[0],"details": details, "current_user": user}
+        context={"request": request, "dossier": dossier,"details": dossier.details, "current_user": user}
     )
 
 @router.post("/fr/modify_detail/{dossier_id}")
@@ -318,7 +391,7 @@ def post_modify_detail(
     candidature_non_retenue: str = Form(...),
     confirmation_information: str = Form(...),
     date_entendu: str = Form(None),
-    position_classement: int = Form(None),
+    position_classement: Optional[str] = Form(None),
     date_soumission_autorites: str = Form(None),
     date_transmission_autorites: str = Form(None),
     date_entree_fonction: str = Form(None),
@@ -367,11 +440,13 @@ def get_edit_dossier_form(request: Request, dossier_id: str, user: UserSchema =
     if user is None:
         return RedirectResponse(url="/fr/login", status_code=302)
 
-    dossier = get_dossier_by_id(dossier_id)
+    dossier = get_dossier_view(dossier_id)
+    if not dossier:
+        raise HTTPException(status_code=404, detail="Dossier not found")
 
     return templatesfr.TemplateResponse(
         "modify_dossier.html",
-        context={"request": request, "dossier": dossier[0], "current_user": user}
+        context={"request": request, "dossier": dossier, "current_user": user}
     )
 
 @router.post("/fr/edit/{dossier_id}")
@@ -426,7 +501,8 @@ def search_dossiers_route(
             'candidats': dossiers,
             'total_candidats': len(dossiers),
             'keyword': keyword,
-            'has_missing_details': has_missing_details
+            'has_missing_details': has_missing_details,
+            'fragment_version': fragment_version([(dossier.id, dossier.version, dossier.details.version if dossier.details else None) for dossier in dossiers])
         }
     )
 
@@ -499,10 +575,8 @@ def get_notif_dossier_form(request: Request, user: UserSchema = Depends(login_ma
     if user.group == 'candidat':
         return RedirectResponse(url="/fr/dossiercandidat", status_code=302)
     
-    session = Session()
-    total_candidats = session.query(DossierCandidats).count()
-    candidats = session.query(DossierCandidats).offset((page - 1) * per_page).limit(per_page).all()
-    session.close()
+    total_candidats = count_dossiers()
+    candidats = get_dossier_rows(page, per_page)
 
     return templatesfr.TemplateResponse(
         "notif_user.html",
@@ -522,14 +596,13 @@ def get_notification_form(
     if user is None:
         return RedirectResponse(url="/fr/login", status_code=302)
 
-    with Session() as session:
-        dossier = session.query(DossierCandidats).filter(DossierCandidats.id == dossier_id).first()
-        if not dossier:
-            raise HTTPException(status_code=404, detail="Dossier not found")
+    dossier = get_dossier_view(dossier_id)
+    if not dossier:
+        raise HTTPException(status_code=404, detail="Dossier not found")
 
-        associated_user = session.query(Users).filter(Users.id == dossier.user_id).first()
-        if not associated_user:
-            raise HTTPException(status_code=404, detail="Associated user not found")
+    associated_user = dossier.user
+    if not associated_user:
+        raise HTTPException(status_code=404, detail="Associated user not found")
 
     return templatesfr.TemplateResponse(
         "send_notif_user.html",
@@ -552,21 +625,11 @@ def export_dossiers_to_excel(user: UserSchema = Depends(login_manager.optional))
     if user and user.group == 'candidat':
         return RedirectResponse(url="/fr/accueil", status_code=302)
 
-    with Session() as session:
-        dossiers = session.query(DossierCandidats).all()
-
-    # Convert dossiers to a pandas DataFrame
-    data = [
-        {
-            "Name": dossier.name,
-            "Email": dossier.mail,
-            "Phone": dossier.phonenumber,
-            "Post Reference": dossier.postereference,
-            "Referring Professor": dossier.profref,
-        }
-        for dossier in dossiers
-    ]
-    df = pd.DataFrame(data)
+    # Convert dossiers to a pandas DataFrame (rows streamed from the database)
+    df = pd.DataFrame.from_records(
+        iter_dossier_export_rows(),
+        columns=["Name", "Email", "Phone", "Post Reference", "Referring Professor"],
+    )
 
     # Create an Excel file in memory
     output = io.BytesIO()
@@ -631,18 +694,9 @@ def send_notification(
     if user is None:
         return RedirectResponse(url="/fr/login", status_code=302)
 
-    with Session() as session:
-        dossier = session.query(DossierCandidats).filter(DossierCandidats.id == dossier_id).first()
-        if not dossier:
-            raise HTTPException(status_code=404, detail="Dossier not found")
-
-        associated_user = session.query(Users).filter(Users.id == dossier.user_id).first()
-        if not associated_user:
-            raise HTTPException(status_code=404, detail="Associated user not found")
-
-        # Add the notification
-        associated_user.notification = message
-        session.commit()
+    # Add the notification
+    if not set_dossier_owner_notification(dossier_id, message):
+        raise HTTPException(status_code=404, detail="Dossier or associated user not found")
 
     return RedirectResponse(url="/fr/notif/dossier", status_code=302)
 
@@ -655,10 +709,8 @@ def get_add_dossier_form(request: Request, user: UserSchema = Depends(login_mana
     if user.group == 'candidat':
         return RedirectResponse(url="/fr/dossiercandidat", status_code=302)
     
-    session = Session()
-    total_candidats = session.query(DossierCandidats).count()
-    candidats = session.query(DossierCandidats).options(joinedload(DossierCandidats.details)).offset((page - 1) * per_page).limit(per_page).all()
-    session.close()
+    total_candidats = count_dossiers()
+    candidats = get_dossier_rows(page, per_page)
 
     return templatesfr.TemplateResponse(
         "supp_dossier.html",
@@ -695,7 +747,8 @@ def get_add_dossier_form(request: Request, user: UserSchema = Depends(login_mana
     
     return templatesfr.TemplateResponse(
         "add_dossier.html",
-        context={"request": request, "current_user": user}
+        # New key for each form -> a double submit sends the same key twice
+        context={"request": request, "current_user": user, "idempotency_key": str(uuid4())}
     )
 
 @router.post("/fr/dossier/new/add")
@@ -708,6 +761,7 @@ async def post_add_dossier(
     profref: str = Form(...),
     phonenumber: str = Form(...),
     image: UploadFile = File(None),
+    idempotency_key: str = Form(None),
     user: UserSchema = Depends(login_manager.optional)
 ):
     """
@@ -734,25 +788,31 @@ async def post_add_dossier(
         static_dir.mkdir(parents=True, exist_ok=True)  # Créer le dossier s'il n'existe pas
         file_name = f"{username}_{name}.{file_extension}"
         file_path = static_dir / file_name
-
-        # Sauvegarder le fichier
-        with open(file_path, "wb") as f:
-            f.write(await image.read())
-
         relative_path = f"../static/images/{file_name}"
     else:
+        file_path = None
         relative_path = default_image_path
     
-    new_dossier = add_dossier_candidat(
-        username=username,
-        name=name,
-        mail=mail,
-        postereference=postereference,
-        profref=profref,
-        phonenumber=phonenumber,
-        image=relative_path if image else None,
-        user_id=user.id
-    )
+    try:
+        new_dossier, created = add_dossier_candidat(
+            username=username,
+            name=name,
+            mail=mail,
+            postereference=postereference,
+            profref=profref,
+            phonenumber=phonenumber,
+            image=relative_path if image else None,
+            user_id=user.id,
+            idempotency_key=idempotency_key or request.headers.get("Idempotency-Key")
+        )
+    except DossierConflictError:
+        raise HTTPException(status_code=409, detail="Un dossier avec cet e-mail et cette référence de poste existe déjà.")
+
+    # Sauvegarder le fichier (seulement pour un nouveau dossier, un doublon garde l'image du premier envoi)
+    if created and file_path is not None:
+        with open(file_path, "wb") as f:
+            f.write(await image.read())
+
     return RedirectResponse(url=f"/fr/details/add/{new_dossier.id}", status_code=302)
 
 @router.get("/fr/details/add/{dossier_id}")
@@ -786,7 +846,7 @@ def post_add_details(
     candidature_non_retenue: Optional[str] = Form("pending"),
     confirmation_information: Optional[bool] = Form(False),
     date_entendu: Optional[str] = Form(None),
-    position_classement: Optional[int] = Form(None),
+    position_classement: Optional[str] = Form(None),
     date_soumission_autorites: Optional[str] = Form(None),
     date_transmission_autorites: Optional[str] = Form(None),
     date_entree_fonction: Optional[str] = Form(None),
@@ -825,22 +885,40 @@ def post_add_details(
     return RedirectResponse(url=f"/fr/dossier/{dossier_id}", status_code=302)
 
 @router.get("/fr/admin/users")
-def get_users_with_groups(request: Request, user: UserSchema = Depends(login_manager.optional)):
+def get_users_with_groups(
+    request: Request,
+    page: int = Query(1, ge=1),
+    per_page: int = Query(25, ge=1, le=USERS_MAX_PER_PAGE),
+    group: str = Query(""),
+    whitelist: str = Query(""),
+    q: str = Query(""),
+    sort: str = Query("username"),
+    order: str = Query("asc"),
+    user: UserSchema = Depends(login_manager.optional)
+):
     """
     Affiche une liste des utilisateurs avec leurs groupes actuels.
     Permet de modifier le groupe de chaque utilisateur individuellement.
+    La liste est paginée, filtrée (groupe, accès, texte) et triée par la base de données.
     """
     if user is None:
         return RedirectResponse(url="/fr/login", status_code=302)
     if user.group != 'admin':  # Vérifie si l'utilisateur est un administrateur
         raise HTTPException(status_code=403, detail="Access forbidden")
 
-    with Session() as session:
-        users = session.query(Users).all()
+    # One page of users, whatever their number: filters, sort and pagination are done by the database
+    users, total_users = get_users_page(
+        page, per_page, group=group or None, whitelist={"yes": True, "no": False}.get(whitelist),
+        search=q.strip() or None, sort=sort, descending=order == "desc",
+    )
 
     return templatesfr.TemplateResponse(
         "change_group.html",
-        context={"request": request, "current_user": user, "users": users}
+        context={
+            "request": request, "current_user": user, "users": users, "total_users": total_users,
+            "page": page, "per_page": per_page, "pages": max(1, -(-total_users // per_page)),
+            "group": group, "whitelist": whitelist, "q": q, "sort": sort, "order": order, "groups": get_user_groups(),
+        }
     )
 
 @router.post("/fr/admin/users/update")
@@ -858,11 +936,84 @@ def update_user_group(
     if user.group != 'admin':  # Vérifie si l'utilisateur est un administrateur
         raise HTTPException(status_code=403, detail="Access forbidden")
 
-    with Session() as session:
-        user_to_update = session.query(Users).filter(Users.id == user_id).first()
-        if not user_to_update:
-            raise HTTPException(status_code=404, detail="User not found")
-        user_to_update.group = new_group
-        session.commit()
+    # The role tables (admins, ...) follow the group
+    if not set_users_group(new_group, ids=[user_id]):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return RedirectResponse(url="/fr/admin/users", status_code=302)
+
+@router.post("/fr/admin/users/bulk")
+def bulk_update_users(
+    request: Request,
+    action: str = Form(...),
+    new_group: str = Form(""),
+    scope: str = Form("selected"),
+    user_ids: List[str] = Form([]),
+    group: str = Form(""),
+    whitelist: str = Form(""),
+    q: str = Form(""),
+    user: UserSchema = Depends(login_manager.optional)
+):
+    """
+    Change le groupe ou l'accès de plusieurs utilisateurs en une transaction : les utilisateurs cochés,
+    ou tous ceux qui correspondent aux filtres de la liste. L'administrateur qui fait le changement n'est jamais modifié.
+    """
+    if user is None:
+        return RedirectResponse(url="/fr/login", status_code=302)
+    if user.group != 'admin':  # Vérifie si l'utilisateur est un administrateur
+        raise HTTPException(status_code=403, detail="Access forbidden")
+
+    if scope == "filtered":
+        targets = {"filters": user_filters(group or None, {"yes": True, "no": False}.get(whitelist), q.strip() or None)}
+    elif user_ids:
+        targets = {"ids": user_ids}
+    else:
+        raise HTTPException(status_code=400, detail="No user selected")
+
+    if action == "group" and new_group:
+        set_users_group(new_group, exclude=user.id, **targets)
+    elif action in ("allow", "block"):
+        set_users_whitelist(action == "allow", exclude=user.id, **targets)
+    else:
+        raise HTTPException(status_code=400, detail="Unknown action")
+
+    # Back to the same filters
+    return RedirectResponse(url=f"/fr/admin/users?{urlencode({'group': group, 'whitelist': whitelist, 'q': q})}", status_code=302)
+
+@router.get("/fr/admin/profiles")
+def get_profiles(request: Request, user: UserSchema = Depends(login_manager.optional)):
+    """
+    Affiche les routes échantillonnées par le profileur continu de ce worker.
+    """
+    if user is None:
+        return RedirectResponse(url="/fr/login", status_code=302)
+    if user.group != 'admin':
+        raise HTTPException(status_code=403, detail="Access forbidden")
+
+    return templatesfr.TemplateResponse(
+        "profiles.html",
+        context={
+            "request": request,
+            "current_user": user,
+            "group": user.group,
+            "routes": profiler.routes(),
+            "samples": profiler.samples,
+            "interval": profiler.interval,
+            "pid": os.getpid(),
+        }
+    )
+
+@router.get("/fr/admin/profiles/download")
+def download_profiles(route: Optional[str] = None, user: UserSchema = Depends(login_manager.optional)):
+    """
+    Télécharge les piles échantillonnées (format folded) d'une route ou de toutes les routes.
+    """
+    if user is None:
+        return RedirectResponse(url="/fr/login", status_code=302)
+    if user.group != 'admin':
+        raise HTTPException(status_code=403, detail="Access forbidden")
 
-    return RedirectResponse(url="/fr/admin/users", status_code=302)
\ No newline at end of file
+    return PlainTextResponse(
+        profiler.folded(route),
+        headers={"Content-Disposition": f"attachment; filename=profile-{os.getpid()}.folded"}
+    )
\ No newline at end of file
@@ -5,6 +5,7 @@ from fastapi import status, Depends, Form
 from ...login_manager import login_manager
 from fastapi.responses import RedirectResponse
 from ...schemas.users import UserSchema
+from ...metrics import instrument_templates
 from typing import Annotated
 from uuid import uuid4
 import hashlib
@@ -14,6 +15,8 @@ user_router = APIRouter()
 
 # Setup Jinja2Templates for HTML rendering
 templatesfr = Jinja2Templates(directory="templates/fr")
+# Render time per template in /metrics
+instrument_templates(templatesfr)
 
 # Route for user login page
 @user_router.get("/fr/login")
@@ -0,0 +1,169 @@
+from datetime import date, datetime
+from typing import Annotated, Dict, List, NamedTuple, Optional, Union
+from pydantic import AfterValidator, BaseModel, BeforeValidator, ConfigDict, Field, TypeAdapter, create_model
+
+#Read-only views of a dossier -> built from the ORM objects inside the session, then immutable
+class DetailsView(BaseModel):
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+    id: int
+    dossier_id: str
+    date_cloture: Optional[datetime] = None
+    date_reception: Optional[datetime] = None
+    dossier_complet: Optional[bool] = None
+    date_transmission_commission: Optional[datetime] = None
+    date_reunion_commission: Optional[datetime] = None
+    candidature_non_retenue: Optional[Union[bool, str]] = None  # Older rows store a boolean
+    confirmation_information: Optional[bool] = None
+    date_entendu: Optional[datetime] = None
+    position_classement: Optional[int] = None
+    date_soumission_autorites: Optional[datetime] = None
+    date_transmission_autorites: Optional[datetime] = None
+    date_entree_fonction: Optional[datetime] = None
+    date_suppression_dossier: Optional[datetime] = None
+    stage: Optional[str] = None
+    next_deadline: Optional[datetime] = None
+    version: int
+
+#Owner of the dossier -> no password in it
+class OwnerView(BaseModel):
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+    id: str
+    username: str
+    name: str
+    surname: str
+    email: str
+    group: str
+    notification: Optional[str] = None
+
+class DossierView(BaseModel):
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+    id: str
+    username: str
+    name: str
+    mail: str
+    postereference: str
+    profref: str
+    phonenumber: str
+    image: Optional[str] = None
+    user_id: str
+    version: int
+    details: Optional[DetailsView] = None
+    user: Optional[OwnerView] = None
+
+#Row of the dossier lists -> only the columns rendered by the tables, no ORM instance
+class DossierRow(NamedTuple):
+    id: str
+    name: str
+    mail: str
+    phonenumber: str
+    postereference: str
+    profref: str
+    image: Optional[str]
+    details_id: Optional[int]
+
+    @property
+    def details(self) -> bool:
+        # The templates only check if the dossier has details
+        return self.details_id is not None
+
+#Candidate home -> the dossiers of a candidate, their stage, the counts and the notification, read by one query
+class CandidateHome(NamedTuple):
+    notification: Optional[str]
+    total: int
+    missing_details: int
+    dossiers: List[DossierRow]
+    stages: Dict[str, str]  # dossier id -> stage of the pipeline
+
+#Bodies of the batch endpoints of the API
+class DossierBatchGet(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=500)
+    fields: Optional[str] = None
+
+class DossierBatchPatch(BaseModel):
+    #{dossier_id: {field: value}}
+    items: Dict[str, Dict[str, str]] = Field(min_length=1, max_length=500)
+
+class DetailsBatchUpdate(BaseModel):
+    #{dossier_id: {field: value}} -> ex: {"id": {"date_reunion_commission": "2025-03-01", "position_classement": 2}}
+    items: Dict[str, Dict[str, Union[str, int, bool, None]]] = Field(min_length=1, max_length=500)
+
+#Writable fields of the details -> parsed the same way by the forms, the batch API and the imports
+NON_RETENUE_VALUES = ["yes", "no", "pending"]
+
+def parse_iso_date(value) -> Optional[datetime]:
+    # 'YYYY-MM-DD' only, fromisoformat is much faster than strptime
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, str) and len(value) == 10 and value[4] == value[7] == "-":
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass  # ex: month 13
+    raise ValueError("must be a date YYYY-MM-DD")
+
+def parse_flag(value) -> bool:
+    # Values of the Yes/No selects of the forms
+    if value is True or value == "True":
+        return True
+    if value is False or value == "False":
+        return False
+    raise ValueError("must be True or False")
+
+def empty_to_none(value):
+    return None if value == "" else value
+
+def non_retenue_value(value) -> Optional[str]:
+    """
+    Normalizes candidature_non_retenue before it is written: the column is a string
+    ("yes" / "no" / "pending", the values of the forms), booleans are converted.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    value = str(value).lower()
+    if value in ("true", "1"):
+        return "yes"
+    if value in ("false", "0"):
+        return "no"
+    return value
+
+def check_non_retenue(value: Optional[str]) -> Optional[str]:
+    if value not in (None, *NON_RETENUE_VALUES):
+        raise ValueError(f"must be one of {NON_RETENUE_VALUES}")
+    return value
+
+IsoDate = Annotated[Optional[datetime], BeforeValidator(parse_iso_date)]
+Flag = Annotated[bool, BeforeValidator(parse_flag)]
+Position = Annotated[Optional[int], BeforeValidator(empty_to_none)]
+NonRetenue = Annotated[Optional[str], BeforeValidator(non_retenue_value), AfterValidator(check_non_retenue)]
+
+#{field: (type, default)}
+DETAILS_INPUT_FIELDS = {
+    "date_cloture": (IsoDate, None),
+    "date_reception": (IsoDate, None),
+    "dossier_complet": (Flag, False),
+    "date_transmission_commission": (IsoDate, None),
+    "date_reunion_commission": (IsoDate, None),
+    "candidature_non_retenue": (NonRetenue, None),
+    "confirmation_information": (Flag, False),
+    "date_entendu": (IsoDate, None),
+    "position_classement": (Position, None),
+    "date_soumission_autorites": (IsoDate, None),
+    "date_transmission_autorites": (IsoDate, None),
+    "date_entree_fonction": (IsoDate, None),
+    "date_suppression_dossier": (IsoDate, None),
+}
+
+#One form -> DetailsInput(**values), raises ValidationError (a ValueError) for a wrong value
+DetailsInput = create_model("DetailsInput", __config__=ConfigDict(extra="forbid", frozen=True), **DETAILS_INPUT_FIELDS)
+
+#Whole columns (batch API, imports) -> one validation per field instead of one per row
+DETAILS_COLUMN_ADAPTERS = {field: TypeAdapter(List[kind]) for field, (kind, default) in DETAILS_INPUT_FIELDS.items()}
@@ -1,3 +1,4 @@
+from typing import NamedTuple
 from pydantic import BaseModel, field_validator
 
 #Schema of users -> we don't use password_confirm in it it's verified in services
@@ -34,4 +35,14 @@ class CandidatSchema(BaseModel):
 
 class SecretariatSchema(BaseModel):
     id:int
-    user_id:str    
\ No newline at end of file
+    user_id:str
+
+#Row of the admin user list -> only the displayed columns, no password and no ORM instance
+class UserRow(NamedTuple):
+    id: str
+    username: str
+    name: str
+    surname: str
+    email: str
+    group: str
+    whitelist: bool
@@ -0,0 +1,155 @@
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, Optional
+from sqlalchemy import select, func, update, insert, delete
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import joinedload
+from ..database import Session, read_only
+from ..models.models import DossierCandidats, DetailsDossierCandidats, DossierAggregates
+from .stages import STAGES, compute_stage
+
+# INSERT ... ON CONFLICT of the dialects that have it, the other ones use UPDATE then INSERT
+UPSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+def bump_dossier_aggregate(session, postereference: str, stage: str, delta: int):
+    """
+    Adds delta to the number of dossiers of a position reference in a stage.
+    Must be called in the session of the write so that both are committed together.
+
+    Args:
+        session (Session): The session of the current write.
+        postereference (str): The position reference of the dossier.
+        stage (str): The pipeline stage of the dossier.
+        delta (int): +1 when a dossier enters the stage, -1 when it leaves it.
+    """
+    dialect = session.get_bind().dialect.name
+    if delta > 0 and dialect in UPSERTS:
+        # A single statement: two first dossiers of a new counter cannot both insert it (READ COMMITTED)
+        session.execute(
+            UPSERTS[dialect](DossierAggregates)
+            .values(postereference=postereference, stage=stage, total=delta)
+            .on_conflict_do_update(
+                index_elements=[DossierAggregates.postereference, DossierAggregates.stage],
+                set_={"total": DossierAggregates.total + delta},
+            )
+        )
+        return
+    result = session.execute(
+        update(DossierAggregates)
+        .where(DossierAggregates.postereference == postereference, DossierAggregates.stage == stage)
+        .values(total=DossierAggregates.total + delta)
+    )
+    if result.rowcount == 0 and delta > 0:
+        session.execute(insert(DossierAggregates).values(postereference=postereference, stage=stage, total=delta))
+
+def move_dossier_aggregate(session, old: Optional[tuple], new: Optional[tuple]):
+    """
+    Moves a dossier from one (postereference, stage) counter to another.
+    Use old=None for a new dossier and new=None for a deleted one.
+
+    Args:
+        session (Session): The session of the current write.
+        old (tuple): (postereference, stage) before the write, or None.
+        new (tuple): (postereference, stage) after the write, or None.
+    """
+    if old == new:
+        return
+    if old is not None:
+        bump_dossier_aggregate(session, old[0], old[1], -1)
+    if new is not None:
+        bump_dossier_aggregate(session, new[0], new[1], 1)
+
+def move_dossier_aggregates(session, moves: Iterable[tuple]):
+    """
+    Applies the moves of many dossiers written in the same session: the moves are summed per
+    (postereference, stage) counter first, then each counter is written once.
+
+    Args:
+        session (Session): The session of the current write.
+        moves (iterable): (old, new) pairs, as given to move_dossier_aggregate.
+    """
+    deltas = Counter()
+    for old, new in moves:
+        if old == new:
+            continue
+        if old is not None:
+            deltas[old] -= 1
+        if new is not None:
+            deltas[new] += 1
+    # Always the same order -> two batches lock the counters in the same order
+    for (postereference, stage), delta in sorted(deltas.items()):
+        if delta:
+            bump_dossier_aggregate(session, postereference, stage, delta)
+
+def rebuild_dossier_aggregates():
+    """
+    Recomputes the whole aggregates table from the dossiers.
+    Only needed when the dossiers were written without the services (ex: initial data).
+    """
+    totals = {}
+    with Session() as session:
+        dossiers = session.execute(
+            select(DossierCandidats).options(joinedload(DossierCandidats.details))
+            .execution_options(yield_per=1000)
+        ).scalars()
+        for dossier in dossiers:
+            key = (dossier.postereference, compute_stage(dossier.details))
+            totals[key] = totals.get(key, 0) + 1
+
+        session.execute(delete(DossierAggregates))
+        if totals:
+            session.execute(insert(DossierAggregates), [
+                {"postereference": postereference, "stage": stage, "total": total}
+                for (postereference, stage), total in totals.items()
+            ])
+        session.commit()
+
+def has_dossier_aggregates() -> bool:
+    """
+    Checks if the aggregates table has been filled.
+    """
+    with Session() as session:
+        return session.scalar(select(select(DossierAggregates.id).exists()))
+
+@read_only
+def get_dossier_dashboard(now: Optional[datetime] = None) -> dict:
+    """
+    Retrieves the overview of the dossiers for the dashboard.
+    Reads the aggregates table (one row per position reference and stage) and counts the
+    expired dossiers with the index on date_suppression_dossier: the cost does not depend
+    on the number of dossiers.
+
+    Args:
+        now (datetime): The reference date for the expired dossiers (default: now).
+
+    Returns:
+        dict: {
+            'total': total number of dossiers,
+            'stages': {stage: number of dossiers} for every stage,
+            'references': {postereference: {stage: number of dossiers}},
+            'expired': number of dossiers past their deletion date,
+        }
+    """
+    now = now or datetime.now()
+    stages = {stage: 0 for stage in STAGES}
+    references = {}
+    with Session() as session:
+        rows = session.execute(
+            select(DossierAggregates.postereference, DossierAggregates.stage, DossierAggregates.total)
+            .where(DossierAggregates.total > 0)
+            .order_by(DossierAggregates.postereference)
+        )
+        for postereference, stage, total in rows:
+            stages[stage] = stages.get(stage, 0) + total
+            references.setdefault(postereference, {})[stage] = total
+        expired = session.scalar(
+            select(func.count(DetailsDossierCandidats.id))
+            .where(DetailsDossierCandidats.date_suppression_dossier < now)
+        )
+    return {
+        'total': sum(stages.values()),
+        'stages': stages,
+        'references': references,
+        'expired': expired,
+    }
@@ -1,16 +1,26 @@
 from typing import Optional, List
 from uuid import uuid4
-from sqlalchemy import select, func
-from ..database import Session
-from ..models.models import DossierCandidats, DetailsDossierCandidats, Users
-from datetime import date, datetime
+from sqlalchemy import select, func, update, bindparam, case, true
+from ..database import Session, read_only, replica_engine
+from ..models.models import DossierCandidats, DetailsDossierCandidats, Users, IdempotencyKeys
+from ..cache import fragment_cache, DOSSIERS_TAG
+from ..errors import DossierConflictError
+from ..schemas.folder import DossierView, DossierRow, CandidateHome, DetailsInput, DETAILS_COLUMN_ADAPTERS
+from .stages import compute_stage, stage_columns, STAGE_MISSING_DETAILS
+from .dashboard import move_dossier_aggregate, move_dossier_aggregates
+from .reminders import reminder_scheduler, reminder_dates
+from datetime import datetime
+from types import SimpleNamespace
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 from sqlalchemy.orm import joinedload
-from msal import ConfidentialClientApplication
+from pydantic import ValidationError
 
+@read_only
 def get_dossier_by_id(id: str) -> (Optional[DossierCandidats], bool): # type: ignore
     """
     Retrieves a dossier by its ID, including its associated details.
@@ -27,6 +37,44 @@ def get_dossier_by_id(id: str) -> (Optional[DossierCandidats], bool): # type: ig
         has_missing_details = dossier.details is None if dossier else False
         return dossier, has_missing_details
     
+@read_only
+def get_dossier_view(dossier_id: str) -> Optional[DossierView]:
+    """
+    Retrieves a dossier with its details and its owner in a single query.
+
+    Args:
+        dossier_id (str): The ID of the dossier.
+
+    Returns:
+        DossierView: An immutable view of the dossier (details and user are None if missing),
+        or None if the dossier does not exist.
+    """
+    with Session() as session:
+        dossier = session.scalar(
+            select(DossierCandidats)
+            .options(joinedload(DossierCandidats.details), joinedload(DossierCandidats.user))
+            .where(DossierCandidats.id == dossier_id)
+        )
+        return DossierView.model_validate(dossier) if dossier else None
+
+def set_dossier_owner_notification(dossier_id: str, message: str) -> bool:
+    """
+    Sets the notification of the user owning a dossier with a single UPDATE statement.
+
+    Args:
+        dossier_id (str): The ID of the dossier.
+        message (str): The notification message.
+
+    Returns:
+        bool: True if the notification was set, False if the dossier or its user does not exist.
+    """
+    owner_id = select(DossierCandidats.user_id).where(DossierCandidats.id == dossier_id).scalar_subquery()
+    with Session() as session:
+        result = session.execute(update(Users).where(Users.id == owner_id).values(notification=message))
+        session.commit()
+        return result.rowcount > 0
+
+@read_only
 def get_details_dossier_by_id(dossier_id: str):
     """
     Retrieves the details of a dossier by its ID.
@@ -39,7 +87,62 @@ def get_details_dossier_by_id(dossier_id: str):
     """
     with Session() as session:
         return session.query(DetailsDossierCandidats).filter_by(dossier_id=dossier_id).first()
-    
+
+@read_only
+def get_dossier_version(dossier_id: str) -> Optional[tuple]:
+    """
+    Retrieves the row versions of a dossier and of its details without loading the ORM objects.
+    Used to build the ETag of the dossier page.
+
+    Args:
+        dossier_id (str): The ID of the dossier.
+
+    Returns:
+        tuple: (dossier version, details version or None), or None if the dossier does not exist.
+    """
+    with Session() as session:
+        row = session.execute(
+            select(DossierCandidats.version, DetailsDossierCandidats.version)
+            .outerjoin(DetailsDossierCandidats, DetailsDossierCandidats.dossier_id == DossierCandidats.id)
+            .where(DossierCandidats.id == dossier_id)
+        ).first()
+        return tuple(row) if row else None
+
+@read_only
+def get_dossiers_versions(page: int = 1, per_page: Optional[int] = None, mail: Optional[str] = None, stage: Optional[str] = None) -> tuple:
+    """
+    Retrieves the total number of dossiers and the (id, version, details version) of the dossiers of a page.
+    The query only reads the version columns, it is used to build the ETag of the list pages.
+
+    Args:
+        page (int): The page number.
+        per_page (int): The number of dossiers per page (None for all the dossiers).
+        mail (str): Only keep the dossiers of this email (None for all the dossiers).
+        stage (str): Only keep the dossiers at this stage (None for all the dossiers).
+
+    Returns:
+        tuple: (total number of dossiers, tuple of (id, version, details version)).
+    """
+    with Session() as session:
+        count_query = select(func.count(DossierCandidats.id))
+        query = (
+            select(DossierCandidats.id, DossierCandidats.version, DetailsDossierCandidats.version)
+            .outerjoin(DetailsDossierCandidats, DetailsDossierCandidats.dossier_id == DossierCandidats.id)
+        )
+        if mail is not None:
+            count_query = count_query.where(DossierCandidats.mail == mail)
+            query = query.where(DossierCandidats.mail == mail)
+        if stage is not None:
+            count_query = count_query.outerjoin(DetailsDossierCandidats, DetailsDossierCandidats.dossier_id == DossierCandidats.id).where(stage_filter(stage))
+            query = query.where(stage_filter(stage))
+        # Same order as get_dossier_rows -> the ETag covers the rows of the page
+        query = query.order_by(DossierCandidats.id)
+        if per_page is not None:
+            query = query.offset((page - 1) * per_page).limit(per_page)
+        total = session.scalar(count_query)
+        return total, tuple(tuple(row) for row in session.execute(query))
+
+@read_only
 def get_dossiers_by_candidat(user_id: str, page: int, per_page: int) -> (List[DossierCandidats], bool): # type: ignore
     """
     Retrieves dossiers associated with a user, with pagination.
@@ -57,7 +160,284 @@ def get_dossiers_by_candidat(user_id: str, page: int, per_page: int) -> (List[Do
         dossiers = session.query(DossierCandidats).options(joinedload(DossierCandidats.details)).filter_by(user_id=user_id).offset((page - 1) * per_page).limit(per_page).all()
         has_missing_details = any(dossier.details is None for dossier in dossiers)
         return dossiers, has_missing_details
-    
+
+@read_only
+def get_dossier_rows(page: int = 1, per_page: Optional[int] = None, mail: Optional[str] = None, stage: Optional[str] = None) -> List[DossierRow]:
+    """
+    Retrieves the dossiers of a list page as lightweight rows.
+    Only the columns rendered by the tables are selected and no ORM instance is built.
+
+    Args:
+        page (int): The page number.
+        per_page (int): The number of dossiers per page (None for all the dossiers).
+        mail (str): Only keep the dossiers of this email (None for all the dossiers).
+        stage (str): Only keep the dossiers at this stage (None for all the dossiers).
+
+    Returns:
+        list: A list of DossierRow.
+    """
+    query = select(
+        DossierCandidats.id,
+        DossierCandidats.name,
+        DossierCandidats.mail,
+        DossierCandidats.phonenumber,
+        DossierCandidats.postereference,
+        DossierCandidats.profref,
+        DossierCandidats.image,
+        DetailsDossierCandidats.id,
+    ).outerjoin(DetailsDossierCandidats, DetailsDossierCandidats.dossier_id == DossierCandidats.id)
+    if mail is not None:
+        query = query.where(DossierCandidats.mail == mail)
+    if stage is not None:
+        query = query.where(stage_filter(stage))
+    # Without an ORDER BY the database may return the same dossier on two pages
+    query = query.order_by(DossierCandidats.id)
+    if per_page is not None:
+        query = query.offset((page - 1) * per_page).limit(per_page)
+    with Session() as session:
+        return [DossierRow._make(row) for row in session.execute(query)]
+
+def stage_filter(stage: str):
+    """
+    Condition keeping the dossiers at a stage, on the indexed stage column of the details
+    (the query must outer join the details: the dossiers without details are at STAGE_MISSING_DETAILS).
+
+    Args:
+        stage (str): One of STAGES.
+    """
+    if stage == STAGE_MISSING_DETAILS:
+        return DetailsDossierCandidats.id.is_(None)
+    return DetailsDossierCandidats.stage == stage
+
+@read_only
+def get_candidate_home(user_id: str, mail: str, page: int = 1, per_page: int = 3) -> CandidateHome:
+    """
+    Reads everything the candidate pages show in a single query (lookup on the index of the dossier mail):
+    the user row is joined to one page of the candidate's dossiers, the counts are window functions
+    computed over all of them before the LIMIT.
+
+    Args:
+        user_id (str): The ID of the candidate (for the notification).
+        mail (str): The email of the candidate, the dossiers are linked by their mail.
+        page (int): The page number.
+        per_page (int): The number of dossiers per page.
+
+    Returns:
+        CandidateHome: The notification, the number of dossiers and of dossiers without details,
+        the dossiers of the page and their stage.
+    """
+    missing = case((DetailsDossierCandidats.id.is_(None), 1), else_=0)
+    dossiers = (
+        select(
+            DossierCandidats.id,
+            DossierCandidats.name,
+            DossierCandidats.mail,
+            DossierCandidats.phonenumber,
+            DossierCandidats.postereference,
+            DossierCandidats.profref,
+            DossierCandidats.image,
+            DetailsDossierCandidats.id.label("details_id"),
+            DetailsDossierCandidats.stage,
+            func.count().over().label("total"),
+            func.sum(missing).over().label("missing_details"),
+        )
+        .outerjoin(DetailsDossierCandidats, DetailsDossierCandidats.dossier_id == DossierCandidats.id)
+        .where(DossierCandidats.mail == mail)
+        # Ordered before the LIMIT -> every dossier is on exactly one page
+        .order_by(DossierCandidats.id)
+        .offset((page - 1) * per_page)
+        .limit(per_page)
+        .subquery()
+    )
+    # The user row is always there, even without any dossier
+    query = (
+        select(Users.notification, dossiers).select_from(Users).outerjoin(dossiers, true())
+        .where(Users.id == user_id)
+        .order_by(dossiers.c.id)
+    )
+    with Session() as session:
+        rows = session.execute(query).all()
+    notification = rows[0].notification if rows else None
+    # A candidate without dossier (or a page past the last one) -> one row of NULLs
+    rows = [row for row in rows if row.id is not None]
+    return CandidateHome(
+        notification=notification,
+        total=rows[0].total if rows else 0,
+        missing_details=rows[0].missing_details if rows else 0,
+        dossiers=[DossierRow(*row[1:9]) for row in rows],
+        stages={row.id: row.stage or STAGE_MISSING_DETAILS for row in rows},
+    )
+
+@read_only
+def has_dossiers_missing_details(mail: Optional[str] = None) -> bool:
+    """
+    Checks with an EXISTS query if at least one dossier has no details.
+
+    Args:
+        mail (str): Only check the dossiers of this email (None for all the dossiers).
+
+    Returns:
+        bool: True if any dossier has missing details, False otherwise.
+    """
+    missing = select(DossierCandidats.id).outerjoin(
+        DetailsDossierCandidats, DetailsDossierCandidats.dossier_id == DossierCandidats.id
+    ).where(DetailsDossierCandidats.id.is_(None))
+    if mail is not None:
+        missing = missing.where(DossierCandidats.mail == mail)
+    with Session() as session:
+        return session.scalar(select(missing.exists()))
+
+@read_only
+def count_dossiers(mail: Optional[str] = None, stage: Optional[str] = None) -> int:
+    """
+    Counts the dossiers.
+
+    Args:
+        mail (str): Only count the dossiers of this email (None for all the dossiers).
+        stage (str): Only count the dossiers at this stage (None for all the dossiers).
+
+    Returns:
+        int: The number of dossiers.
+    """
+    query = select(func.count(DossierCandidats.id))
+    if mail is not None:
+        query = query.where(DossierCandidats.mail == mail)
+    if stage is not None:
+        query = query.outerjoin(DetailsDossierCandidats, DetailsDossierCandidats.dossier_id == DossierCandidats.id).where(stage_filter(stage))
+    with Session() as session:
+        return session.scalar(query)
+
+def iter_dossier_export_rows(batch_size: int = 1000):
+    """
+    Streams the columns of the Excel export for all the dossiers, from the replica.
+    The rows are fetched batch_size at a time (server-side cursor on PostgreSQL),
+    the dossiers are never all loaded as ORM objects.
+
+    Yields:
+        tuple: (name, mail, phonenumber, postereference, profref)
+    """
+    with Session(bind=replica_engine) as session:
+        rows = session.execute(
+            select(
+                DossierCandidats.name,
+                DossierCandidats.mail,
+                DossierCandidats.phonenumber,
+                DossierCandidats.postereference,
+                DossierCandidats.profref,
+            )
+            .order_by(DossierCandidats.id)
+            .execution_options(stream_results=True, yield_per=batch_size)
+        )
+        for row in rows:
+            yield tuple(row)
+
+# Columns readable through the API (sparse fieldsets)
+DOSSIER_FIELDS = ["id", "username", "name", "mail", "postereference", "profref", "phonenumber", "image", "user_id", "version"]
+DETAILS_FIELDS = [
+    "date_cloture", "date_reception", "dossier_complet", "date_transmission_commission", "date_reunion_commission",
+    "candidature_non_retenue", "confirmation_information", "date_entendu", "position_classement",
+    "date_soumission_autorites", "date_transmission_autorites", "date_entree_fonction", "date_suppression_dossier", "version",
+]
+# Columns writable through patch_dossiers
+PATCHABLE_DOSSIER_FIELDS = ["name", "mail", "phonenumber", "postereference", "profref"]
+
+@read_only
+def get_dossier_records(
+    fields: Optional[List[str]] = None,
+    details_fields: Optional[List[str]] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    ids: Optional[List[str]] = None,
+    mail: Optional[str] = None,
+) -> List[dict]:
+    """
+    Retrieves dossiers as plain dicts, selecting only the requested columns.
+    The dossiers are ordered by id so that the last id of a page is the cursor of the next one
+    (keyset pagination: the cost of a page does not depend on its position).
+
+    Args:
+        fields (list): Columns of DOSSIER_FIELDS to return (None for all). The id is always returned.
+        details_fields (list): Columns of DETAILS_FIELDS to return under 'details' (None for no details).
+        after (str): Only return the dossiers whose id is greater than this cursor.
+        limit (int): The maximum number of dossiers (None for no limit).
+        ids (list): Only return these dossiers.
+        mail (str): Only return the dossiers of this email.
+
+    Returns:
+        list: A list of dicts, 'details' is None for a dossier without details.
+    """
+    fields = list(DOSSIER_FIELDS if fields is None else dict.fromkeys(["id", *fields]))
+    columns = [getattr(DossierCandidats, field).label(field) for field in fields]
+    if details_fields is not None:
+        columns.append(DetailsDossierCandidats.id.label("details.id"))
+        columns += [getattr(DetailsDossierCandidats, field).label(f"details.{field}") for field in details_fields]
+    query = select(*columns).order_by(DossierCandidats.id)
+    if details_fields is not None:
+        query = query.outerjoin(DetailsDossierCandidats, DetailsDossierCandidats.dossier_id == DossierCandidats.id)
+    if after is not None:
+        query = query.where(DossierCandidats.id > after)
+    if ids is not None:
+        query = query.where(DossierCandidats.id.in_(ids))
+    if mail is not None:
+        query = query.where(DossierCandidats.mail == mail)
+    if limit is not None:
+        query = query.limit(limit)
+
+    records = []
+    with Session() as session:
+        for row in session.execute(query).mappings():
+            record = {field: row[field] for field in fields}
+            if details_fields is not None:
+                record["details"] = None if row["details.id"] is None else {
+                    field: row[f"details.{field}"] for field in details_fields
+                }
+            records.append(record)
+    return records
+
+def patch_dossiers(changes: dict) -> dict:
+    """
+    Applies partial updates to many dossiers in a single transaction.
+
+    Args:
+        changes (dict): {dossier_id: {field: value}} with fields of PATCHABLE_DOSSIER_FIELDS.
+
+    Returns:
+        dict: {dossier_id: 'updated' | 'not_found' | 'invalid' | 'conflict'}
+    """
+    results = {}
+    valid = {}
+    for dossier_id, values in changes.items():
+        if not values or any(field not in PATCHABLE_DOSSIER_FIELDS for field in values):
+            results[dossier_id] = "invalid"
+        else:
+            valid[dossier_id] = values
+    if not valid:
+        return results
+
+    with Session() as session:
+        dossiers = session.scalars(select(DossierCandidats).where(DossierCandidats.id.in_(valid))).unique().all()
+        found = {dossier.id: dossier for dossier in dossiers}
+        results.update({dossier_id: "not_found" for dossier_id in valid if dossier_id not in found})
+        try:
+            for dossier_id, values in valid.items():
+                dossier = found.get(dossier_id)
+                if dossier is None:
+                    continue
+                stage = compute_stage(dossier.details)
+                old_aggregate = (dossier.postereference, stage)
+                for field, value in values.items():
+                    setattr(dossier, field, value)
+                results[dossier_id] = "updated"
+                move_dossier_aggregate(session, old_aggregate, (dossier.postereference, stage))
+            session.commit()
+        except (IntegrityError, StaleDataError):
+            # A new (mail, postereference) is already used, or a dossier was deleted meanwhile -> nothing is written
+            session.rollback()
+            return {**results, **{dossier_id: "conflict" for dossier_id in found}}
+    if found:
+        fragment_cache.invalidate_tag(DOSSIERS_TAG)
+    return results
+
 def update_dossier(dossier_id: str, name: str, mail: str, phonenumber: str, postereference: str) -> bool:
     """
     Updates the information of a dossier in the database.
@@ -77,12 +457,27 @@ def update_dossier(dossier_id: str, name: str, mail: str, phonenumber: str, post
         if not dossier:
             return False
 
+        stage = compute_stage(dossier.details)
+        old_aggregate = (dossier.postereference, stage)
+
         dossier.name = name
         dossier.mail = mail
         dossier.phonenumber = phonenumber
         dossier.postereference = postereference
 
-        session.commit()
+        try:
+            # The stage does not change but the position reference may
+            move_dossier_aggregate(session, old_aggregate, (postereference, stage))
+            session.commit()
+        except IntegrityError:
+            # Another dossier already has this mail and position reference
+            session.rollback()
+            return False
+        except StaleDataError:
+            # The dossier was deleted since it was read (ex: retention purge)
+            session.rollback()
+            return False
+        fragment_cache.invalidate_tag(DOSSIERS_TAG)
         return True
 
 def update_dossier_details(
@@ -126,36 +521,186 @@ def update_dossier_details(
 
     Returns:
         bool: True if the update was successful, False otherwise.
+
+    Raises:
+        ValueError: A field has a wrong value.
     """
+    values = parse_details(
+        date_cloture=date_cloture,
+        date_reception=date_reception,
+        dossier_complet=dossier_complet,
+        date_transmission_commission=date_transmission_commission,
+        date_reunion_commission=date_reunion_commission,
+        candidature_non_retenue=candidature_non_retenue,
+        confirmation_information=confirmation_information,
+        date_entendu=date_entendu,
+        position_classement=position_classement,
+        date_soumission_autorites=date_soumission_autorites,
+        date_transmission_autorites=date_transmission_autorites,
+        date_entree_fonction=date_entree_fonction,
+        date_suppression_dossier=date_suppression_dossier
+    )
     with Session() as session:
         dossier = session.query(DossierCandidats).filter_by(id=dossier_id).first()
         details = session.query(DetailsDossierCandidats).filter_by(dossier_id=dossier_id).first()
         if dossier and details:
+            old_aggregate = (dossier.postereference, compute_stage(details))
+
             dossier.mail = mail
             dossier.phonenumber = phonenumber
+            for field, value in {**values, **stage_columns(SimpleNamespace(**values))}.items():
+                setattr(details, field, value)
+
+            dates = reminder_dates(details)
             
-            details.date_cloture = datetime.strptime(date_cloture, '%Y-%m-%d') if date_cloture else None
-            details.date_reception = datetime.strptime(date_reception, '%Y-%m-%d') if date_reception else None
-            details.date_transmission_commission = datetime.strptime(date_transmission_commission, '%Y-%m-%d') if date_transmission_commission else None
-            details.date_reunion_commission = datetime.strptime(date_reunion_commission, '%Y-%m-%d') if date_reunion_commission else None
-            details.date_entendu = datetime.strptime(date_entendu, '%Y-%m-%d') if date_entendu else None
-            details.date_soumission_autorites = datetime.strptime(date_soumission_autorites, '%Y-%m-%d') if date_soumission_autorites else None
-            details.date_transmission_autorites = datetime.strptime(date_transmission_autorites, '%Y-%m-%d') if date_transmission_autorites else None
-            details.date_entree_fonction = datetime.strptime(date_entree_fonction, '%Y-%m-%d') if date_entree_fonction else None
-            details.date_suppression_dossier = datetime.strptime(date_suppression_dossier, '%Y-%m-%d') if date_suppression_dossier else None
-            
-            
-            details.dossier_complet = dossier_complet == "True"
-            details.candidature_non_retenue = candidature_non_retenue == "True"
-            details.confirmation_information = confirmation_information == "True"
-            
-            
-            details.position_classement = position_classement
-            
-            session.commit()
+            try:
+                move_dossier_aggregate(session, old_aggregate, (dossier.postereference, details.stage))
+                session.commit()
+            except IntegrityError:
+                # Another dossier already has this mail and position reference
+                session.rollback()
+                return False
+            except StaleDataError:
+                # The dossier was deleted since it was read (ex: retention purge)
+                session.rollback()
+                return False
+            fragment_cache.invalidate_tag(DOSSIERS_TAG)
+            reminder_scheduler.schedule(dossier_id, dates)
             return True
         return False
     
+def parse_details(**values) -> dict:
+    """
+    Parses the details fields of one form, the missing ones get their default (see DETAILS_INPUT_FIELDS).
+
+    Returns:
+        dict: {field: parsed value} for all the details fields.
+
+    Raises:
+        ValueError: A field has a wrong value.
+    """
+    return DetailsInput(**{field: value for field, value in values.items() if value is not None}).model_dump()
+
+def _error_message(field: str, error: dict) -> str:
+    # "dossier_complet must be True or False" rather than pydantic's "Value error, ..."
+    if error["type"] == "value_error":
+        return f"{field} {error['ctx']['error']}"
+    return f"{field}: {error['msg']}"
+
+def parse_details_columns(changes: dict) -> tuple:
+    """
+    Parses partial details of many dossiers column by column: the distinct values of a field are
+    validated in a single call, much faster than a validation per row for large batches (imports).
+
+    Args:
+        changes (dict): {dossier_id: {field: value}}
+
+    Returns:
+        tuple: ({dossier_id: {field: parsed value}}, {dossier_id: error message}), the rows with an error
+        are only in the second dict.
+    """
+    errors = {}
+    for dossier_id, values in changes.items():
+        if not values:
+            errors[dossier_id] = "no field to update"
+        elif not values.keys() <= DETAILS_COLUMN_ADAPTERS.keys():
+            field = next(field for field in values if field not in DETAILS_COLUMN_ADAPTERS)
+            errors[dossier_id] = f"{field} can not be updated"
+    rows = [(dossier_id, values) for dossier_id, values in changes.items() if dossier_id not in errors]
+
+    parsed = {dossier_id: {} for dossier_id, values in rows}
+    for field, adapter in DETAILS_COLUMN_ADAPTERS.items():
+        ids = [dossier_id for dossier_id, values in rows if field in values]
+        if not ids:
+            continue
+        column = [changes[dossier_id][field] for dossier_id in ids]
+        # A column repeats a few values (dates of a meeting, flags): each one is parsed once.
+        # The type is part of the key, True and 1 are not the same value for a flag
+        keys = list(zip(map(type, column), column))
+        distinct = list(dict.fromkeys(keys))
+        wrong = {}
+        try:
+            values = adapter.validate_python([value for kind, value in distinct])
+        except ValidationError as e:
+            for error in e.errors():
+                wrong.setdefault(distinct[error["loc"][0]], _error_message(field, error))
+            # The other values of the column are valid
+            distinct = [key for key in distinct if key not in wrong]
+            values = adapter.validate_python([value for kind, value in distinct])
+        lookup = dict(zip(distinct, values))
+        for dossier_id, key in zip(ids, keys):
+            if key in lookup:
+                parsed[dossier_id][field] = lookup[key]
+            else:
+                errors.setdefault(dossier_id, wrong[key])
+    return {dossier_id: values for dossier_id, values in parsed.items() if dossier_id not in errors}, errors
+
+def update_details_batch(changes: dict) -> tuple:
+    """
+    Applies partial updates to the details of many dossiers in a single transaction.
+    Every row is validated before anything is written, then the rows are grouped by set of
+    updated columns and each group is written with one executemany UPDATE. The dashboard counters
+    are written once per (postereference, stage) they gain or lose dossiers.
+
+    Args:
+        changes (dict): {dossier_id: {field: value}}, dates as 'YYYY-MM-DD', booleans as True/"True",
+            candidature_non_retenue as "yes" / "no" / "pending".
+
+    Returns:
+        tuple: ({dossier_id: 'updated' | 'not_found' | 'invalid'}, {dossier_id: error message})
+    """
+    parsed, errors = parse_details_columns(changes)
+    results = {dossier_id: "invalid" for dossier_id in errors}
+    if not parsed:
+        return results, errors
+
+    table = DetailsDossierCandidats.__table__
+    with Session() as session:
+        # Current values -> existence check and stage before/after
+        rows = session.execute(
+            select(DossierCandidats.postereference, DetailsDossierCandidats)
+            .join(DetailsDossierCandidats, DetailsDossierCandidats.dossier_id == DossierCandidats.id)
+            .where(DossierCandidats.id.in_(parsed))
+        ).all()
+        current = {details.dossier_id: (postereference, details) for postereference, details in rows}
+
+        groups = {}
+        reminders = {}
+        moves = []
+        for dossier_id, values in parsed.items():
+            if dossier_id not in current:
+                results[dossier_id] = "not_found"
+                continue
+            postereference, details = current[dossier_id]
+            new_details = SimpleNamespace(**{**{column.key: getattr(details, column.key) for column in table.columns}, **values})
+            # The derived columns are written with the others
+            values = {**values, **stage_columns(new_details)}
+            moves.append(((postereference, compute_stage(details)), (postereference, values["stage"])))
+            reminders[dossier_id] = reminder_dates(new_details)
+            groups.setdefault(tuple(sorted(values)), []).append(
+                {"_id": details.id, **{f"_{field}": value for field, value in values.items()}}
+            )
+            results[dossier_id] = "updated"
+
+        # The version is bumped by the onupdate of the column
+        for fields, params in groups.items():
+            session.execute(
+                update(table)
+                .where(table.c.id == bindparam("_id"))
+                .values(**{field: bindparam(f"_{field}") for field in fields}),
+                params,
+            )
+        # One statement per counter, not per row
+        move_dossier_aggregates(session, moves)
+        session.commit()
+
+    if reminders:
+        fragment_cache.invalidate_tag(DOSSIERS_TAG)
+        for dossier_id, dates in reminders.items():
+            reminder_scheduler.schedule(dossier_id, dates)
+    return results, errors
+
+@read_only
 def search_dossiers(keyword: str, page: int = 1, per_page: int = 10) -> (List[DossierCandidats], bool): # type: ignore
     """
     Searches for dossiers based on a keyword using strict equality.
@@ -182,9 +727,39 @@ def search_dossiers(keyword: str, page: int = 1, per_page: int = 10) -> (List[Do
         has_missing_details = any(dossier.details is None for dossier in dossiers)
         return dossiers, has_missing_details
     
-def add_dossier_candidat(username: str, name: str, mail: str, postereference: str, profref: str, phonenumber: str, image: str, user_id: str) -> DossierCandidats:
+def find_existing_dossier(session, mail: str, postereference: str, user_id: str, idempotency_key: Optional[str] = None) -> Optional[DossierCandidats]:
+    """
+    Finds the dossier a create request would duplicate: the dossier created with the same
+    idempotency key by the same user, or the dossier with the same mail and position reference.
+    """
+    if idempotency_key:
+        dossier_id = session.scalar(
+            select(IdempotencyKeys.dossier_id)
+            .where(IdempotencyKeys.key == idempotency_key, IdempotencyKeys.user_id == user_id)
+        )
+        if dossier_id is not None:
+            dossier = session.get(DossierCandidats, dossier_id)
+            if dossier is not None:
+                return dossier
+    # Uses the unique index on (mail, postereference)
+    return session.scalar(
+        select(DossierCandidats).where(DossierCandidats.mail == mail, DossierCandidats.postereference == postereference)
+    )
+
+def check_dossier_owner(dossier: DossierCandidats, user_id: str) -> DossierCandidats:
+    """
+    Returns the dossier found by find_existing_dossier if it was created by the user.
+    The dossier of another user is never returned (its id would lead to its details).
+    """
+    if dossier.user_id != user_id:
+        raise DossierConflictError("A dossier with this mail and position reference already exists.")
+    return dossier
+
+def add_dossier_candidat(username: str, name: str, mail: str, postereference: str, profref: str, phonenumber: str, image: str, user_id: str, idempotency_key: Optional[str] = None) -> (DossierCandidats, bool): # type: ignore
     """
     Adds a new candidate dossier to the database.
+    Retries are safe: if the idempotency key was already used, or if the same user already created
+    a dossier with the same mail and position reference, the existing dossier is returned and nothing is inserted.
 
     Args:
         username (str): The username of the candidate.
@@ -195,9 +770,13 @@ def add_dossier_candidat(username: str, name: str, mail: str, postereference: st
         phonenumber (str): The phone number of the candidate.
         image (str): The image link.
         user_id (str): The ID of the user.
+        idempotency_key (str): The key sent with the form (None if the client did not send one).
 
     Returns:
-        DossierCandidats: The newly created dossier.
+        tuple: The newly created dossier (or the existing one) and a boolean (True if the dossier was created).
+
+    Raises:
+        DossierConflictError: If another user already created a dossier with the same mail and position reference.
     """
     new_dossier = DossierCandidats(
         id=str(uuid4()),
@@ -211,10 +790,26 @@ def add_dossier_candidat(username: str, name: str, mail: str, postereference: st
         user_id=user_id
     )
     with Session() as session:
+        existing = find_existing_dossier(session, mail, postereference, user_id, idempotency_key)
+        if existing is not None:
+            return check_dossier_owner(existing, user_id), False
+
         session.add(new_dossier)
-        session.commit()
+        if idempotency_key:
+            session.add(IdempotencyKeys(key=idempotency_key, user_id=user_id, dossier_id=new_dossier.id))
+        move_dossier_aggregate(session, None, (postereference, STAGE_MISSING_DETAILS))
+        try:
+            session.commit()
+        except IntegrityError:
+            # The same dossier was inserted by a concurrent request
+            session.rollback()
+            existing = find_existing_dossier(session, mail, postereference, user_id, idempotency_key)
+            if existing is None:
+                raise
+            return check_dossier_owner(existing, user_id), False
         session.refresh(new_dossier)
-    return new_dossier
+    fragment_cache.invalidate_tag(DOSSIERS_TAG)
+    return new_dossier, True
 
 
 def add_details_dossier_candidat(
@@ -253,33 +848,47 @@ def add_details_dossier_candidat(
         date_suppression_dossier (str): The dossier deletion date.
 
     Returns:
-        DetailsDossierCandidats: The newly created dossier details.
+        DetailsDossierCandidats: The newly created dossier details, or the existing ones
+        if the dossier already has details (double submit of the form).
     """
 
-    # Fonction pour convertir une chaîne de caractères en objet date
-    def parse_date(date_str: Optional[str]) -> Optional[date]:
-        return datetime.strptime(date_str, "%Y-%m-%d").date() if date_str else None
-
-    new_details = DetailsDossierCandidats(
-        dossier_id=dossier_id,
-        date_cloture=parse_date(date_cloture),
-        date_reception=parse_date(date_reception),
+    values = parse_details(
+        date_cloture=date_cloture,
+        date_reception=date_reception,
         dossier_complet=dossier_complet,
-        date_transmission_commission=parse_date(date_transmission_commission),
-        date_reunion_commission=parse_date(date_reunion_commission),
+        date_transmission_commission=date_transmission_commission,
+        date_reunion_commission=date_reunion_commission,
         candidature_non_retenue=candidature_non_retenue,
         confirmation_information=confirmation_information,
-        date_entendu=parse_date(date_entendu),
+        date_entendu=date_entendu,
         position_classement=position_classement,
-        date_soumission_autorites=parse_date(date_soumission_autorites),
-        date_transmission_autorites=parse_date(date_transmission_autorites),
-        date_entree_fonction=parse_date(date_entree_fonction),
-        date_suppression_dossier=parse_date(date_suppression_dossier)
+        date_soumission_autorites=date_soumission_autorites,
+        date_transmission_autorites=date_transmission_autorites,
+        date_entree_fonction=date_entree_fonction,
+        date_suppression_dossier=date_suppression_dossier
     )
+    new_details = DetailsDossierCandidats(dossier_id=dossier_id, **values, **stage_columns(SimpleNamespace(**values)))
     with Session() as session:
+        existing = session.scalar(select(DetailsDossierCandidats).where(DetailsDossierCandidats.dossier_id == dossier_id))
+        if existing is not None:
+            return existing
+
         session.add(new_details)
-        session.commit()
+        postereference = session.scalar(select(DossierCandidats.postereference).where(DossierCandidats.id == dossier_id))
+        if postereference is not None:
+            move_dossier_aggregate(session, (postereference, STAGE_MISSING_DETAILS), (postereference, new_details.stage))
+        try:
+            session.commit()
+        except IntegrityError:
+            # dossier_id is unique -> the details were added by a concurrent request
+            session.rollback()
+            existing = session.scalar(select(DetailsDossierCandidats).where(DetailsDossierCandidats.dossier_id == dossier_id))
+            if existing is None:
+                raise
+            return existing
         session.refresh(new_details)
+    fragment_cache.invalidate_tag(DOSSIERS_TAG)
+    reminder_scheduler.schedule(dossier_id, reminder_dates(new_details))
     return new_details
 
 def delete_candidat(candidat_id: str) -> bool:
@@ -294,9 +903,14 @@ def delete_candidat(candidat_id: str) -> bool:
     """
     with Session() as session:
         candidat = session.query(DossierCandidats).filter(DossierCandidats.id == candidat_id).first()
-        
+        if not candidat:
+            return False
+
+        move_dossier_aggregate(session, (candidat.postereference, compute_stage(candidat.details)), None)
         session.delete(candidat)
         session.commit()
+        fragment_cache.invalidate_tag(DOSSIERS_TAG)
+        reminder_scheduler.unschedule(candidat_id)
         return True
 
 
@@ -0,0 +1,320 @@
+import heapq
+import itertools
+import os
+import threading
+import time as clock
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Optional
+from sqlalchemy import select, or_
+from sqlalchemy.exc import IntegrityError
+from ..database import Session, read_only
+from ..models.models import DossierCandidats, DetailsDossierCandidats, Reminders
+
+# Timeline dates that trigger a reminder
+REMINDER_FIELDS = ["date_cloture", "date_reunion_commission", "date_entendu", "date_entree_fonction"]
+
+# Labels of the reminders shown by the templates (Jinja global reminder_labels), per language
+REMINDER_LABELS = {
+    "en": {
+        "date_cloture": "Application deadline",
+        "date_reunion_commission": "Committee meeting",
+        "date_entendu": "Candidate interview",
+        "date_entree_fonction": "Start of employment",
+    },
+    "fr": {
+        "date_cloture": "Clôture des candidatures",
+        "date_reunion_commission": "Réunion de la commission",
+        "date_entendu": "Audition du candidat",
+        "date_entree_fonction": "Entrée en fonction",
+    },
+}
+# A reminder without label would render an empty line -> checked at import
+for language, labels in REMINDER_LABELS.items():
+    if set(labels) != set(REMINDER_FIELDS):
+        raise RuntimeError(f"REMINDER_LABELS[{language!r}] does not match REMINDER_FIELDS")
+
+# A write is stamped (updated_at) before its commit -> every refresh also reads again the rows of this window
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+def reminder_dates(details) -> dict:
+    """
+    Extracts the reminder dates of a dossier from its details (ORM object or view).
+
+    Returns:
+        dict: {field: datetime} for the fields of REMINDER_FIELDS that are set.
+    """
+    dates = {}
+    for field in REMINDER_FIELDS:
+        value = getattr(details, field, None)
+        if value is None:
+            continue
+        # add_details_dossier_candidat stores dates, update_dossier_details datetimes
+        if not isinstance(value, datetime) and isinstance(value, date):
+            value = datetime.combine(value, time())
+        dates[field] = value
+    return dates
+
+def notify_dossier_owner(dossier_id: str, field: str, when: datetime) -> bool:
+    """
+    Stores the reminder for the user owning the dossier.
+    The notification sent by the staff is kept, the candidate pages list the reminders in their language.
+
+    Returns:
+        bool: False if the dossier does not exist anymore.
+    """
+    with Session() as session:
+        user_id = session.scalar(select(DossierCandidats.user_id).where(DossierCandidats.id == dossier_id))
+        if user_id is None:
+            return False
+        session.add(Reminders(user_id=user_id, dossier_id=dossier_id, field=field, date=when))
+        try:
+            session.commit()
+        except IntegrityError:
+            # Already sent by the worker that ran the background jobs before this one
+            session.rollback()
+        return True
+
+@read_only
+def get_user_reminders(user_id: str, now: Optional[datetime] = None) -> list:
+    """
+    Retrieves the reminders of a user whose date has not passed yet, the soonest first.
+
+    Args:
+        user_id (str): The ID of the user.
+        now (datetime): The current date (default: now).
+
+    Returns:
+        list: Rows (field, date, dossier_id, name), name is the name on the dossier.
+    """
+    today = datetime.combine((now or datetime.now()).date(), time())
+    with Session() as session:
+        return session.execute(
+            select(Reminders.field, Reminders.date, Reminders.dossier_id, DossierCandidats.name)
+            .join(DossierCandidats, DossierCandidats.id == Reminders.dossier_id)
+            .where(Reminders.user_id == user_id, Reminders.date >= today)
+            .order_by(Reminders.date, Reminders.id)
+        ).all()
+
+class ReminderScheduler:
+    """
+    Fires a reminder some time (lead) before each upcoming timeline date of the dossiers.
+
+    The reminders are kept in a min-heap ordered by firing time, so the thread only wakes up
+    when the next reminder is due. When the details of a dossier change, its reminders are
+    replaced: the dossier gets a new version number and the old heap entries are dropped
+    when they reach the top (no scan of the heap or of the table).
+
+    The heap is built once from all the details (load), then every reload_interval only the
+    details written since the previous read are read again (refresh, index on updated_at):
+    with several workers this is how the writes of the other processes reach the scheduler.
+    """
+
+    def __init__(self, lead: timedelta = timedelta(hours=24), notify: Optional[Callable] = None, reload_interval: float = 60):
+        self.lead = lead
+        self.notify = notify or notify_dossier_owner
+        # Seconds between two refreshes (the details written by the other workers)
+        self.reload_interval = reload_interval
+        # Entries: (fire_at, sequence, dossier_id, field, when, version)
+        self._heap = []
+        # dossier_id -> version of its current entries
+        self._versions = {}
+        self._counter = itertools.count()
+        self._stale = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self.fired = 0
+        # (dossier_id, field, date) -> firing time of the reminders fired, kept while a refresh can read them again
+        self._fired = {}
+
+    def __len__(self):
+        with self._condition:
+            return len(self._heap) - self._stale
+
+    def load(self, now: Optional[datetime] = None):
+        """
+        Builds the heap from the details of all the dossiers (at startup).
+
+        Args:
+            now (datetime): The current date (default: now).
+        """
+        now = now or datetime.now()
+        limit = now + self.lead
+        columns = [getattr(DetailsDossierCandidats, field) for field in REMINDER_FIELDS]
+        with Session() as session:
+            rows = session.execute(
+                select(DetailsDossierCandidats.dossier_id, *columns)
+                .where(or_(*(column > limit for column in columns)))
+            ).all()
+        with self._condition:
+            self._heap = []
+            self._versions = {}
+            self._stale = 0
+            self._fired = {}
+            for row in rows:
+                self._push(row.dossier_id, reminder_dates(row), now)
+            heapq.heapify(self._heap)
+            self._condition.notify()
+
+    def refresh(self, since: datetime, now: Optional[datetime] = None) -> int:
+        """
+        Replaces the reminders of the dossiers whose details were written since the given date,
+        by this process or by another worker (schedule only reaches the process running the scheduler).
+
+        Args:
+            since (datetime): The date of the previous load or refresh. The reminders due since
+                then are kept, except the ones this scheduler already fired.
+            now (datetime): The current date (default: now).
+
+        Returns:
+            int: The number of dossiers read.
+        """
+        now = now or datetime.now()
+        since = min(since, now) - REFRESH_OVERLAP
+        columns = [getattr(DetailsDossierCandidats, field) for field in REMINDER_FIELDS]
+        with Session() as session:
+            rows = session.execute(
+                select(DetailsDossierCandidats.dossier_id, *columns)
+                .where(DetailsDossierCandidats.updated_at > since)
+            ).all()
+        with self._condition:
+            # The reminders fired before the window can not be pushed again
+            self._fired = {key: fire_at for key, fire_at in self._fired.items() if fire_at > since}
+            for row in rows:
+                dates = {field: when for field, when in reminder_dates(row).items() if (row.dossier_id, field, when) not in self._fired}
+                self._drop(row.dossier_id)
+                for entry in self._push(row.dossier_id, dates, since, heap=False):
+                    heapq.heappush(self._heap, entry)
+            self._compact()
+            self._condition.notify()
+        return len(rows)
+
+    def schedule(self, dossier_id: str, dates: dict, now: Optional[datetime] = None):
+        """
+        Replaces the reminders of a dossier (call it after the details were written).
+
+        Args:
+            dossier_id (str): The ID of the dossier.
+            dates (dict): {field: datetime}, see reminder_dates.
+        """
+        # Only the process running the scheduler keeps a heap, the other workers reach it through refresh
+        if self._thread is None:
+            return
+        now = now or datetime.now()
+        with self._condition:
+            self._drop(dossier_id)
+            for entry in self._push(dossier_id, dates, now, heap=False):
+                heapq.heappush(self._heap, entry)
+            self._compact()
+            self._condition.notify()
+
+    def unschedule(self, dossier_id: str):
+        """
+        Removes the reminders of a deleted dossier.
+        """
+        if self._thread is None:
+            return
+        with self._condition:
+            self._drop(dossier_id)
+            self._compact()
+
+    def pop_due(self, now: Optional[datetime] = None) -> list:
+        """
+        Removes and returns the reminders due at the given time.
+
+        Returns:
+            list: [(dossier_id, field, date)]
+        """
+        now = now or datetime.now()
+        due = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                fire_at, _, dossier_id, field, when, version = heapq.heappop(self._heap)
+                current = self._versions.get(dossier_id)
+                if current is None or current[0] != version:
+                    self._stale -= 1
+                    continue
+                due.append((dossier_id, field, when))
+                if current[1] == 1:
+                    del self._versions[dossier_id]
+                else:
+                    self._versions[dossier_id] = (version, current[1] - 1)
+        return due
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _push(self, dossier_id: str, dates: dict, now: datetime, heap: bool = True) -> list:
+        # Creates the entries of a dossier (appended to the heap list when heap=True, must be heapified)
+        version = next(self._counter)
+        entries = [
+            (when - self.lead, next(self._counter), dossier_id, field, when, version)
+            for field, when in dates.items()
+            if when - self.lead > now
+        ]
+        if entries:
+            self._versions[dossier_id] = (version, len(entries))
+            if heap:
+                self._heap.extend(entries)
+        return entries
+
+    def _drop(self, dossier_id: str):
+        current = self._versions.pop(dossier_id, None)
+        if current is not None:
+            self._stale += current[1]
+
+    def _compact(self):
+        # Rebuilds the heap once most of it is made of replaced entries
+        if self._stale > 64 and self._stale * 2 > len(self._heap):
+            self._heap = [entry for entry in self._heap if self._versions.get(entry[2], (None,))[0] == entry[5]]
+            heapq.heapify(self._heap)
+            self._stale = 0
+
+    def _run(self):
+        next_refresh = clock.monotonic() + self.reload_interval
+        last_refresh = datetime.now()
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+                timeout = next_refresh - clock.monotonic()
+                if self._heap:
+                    timeout = min(timeout, (self._heap[0][0] - datetime.now()).total_seconds())
+                if timeout > 0:
+                    # Woken up earlier by schedule() when a sooner reminder is added
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    return
+            for dossier_id, field, when in self.pop_due():
+                try:
+                    self.notify(dossier_id, field, when)
+                    self.fired += 1
+                    self._fired[(dossier_id, field, when)] = when - self.lead
+                except Exception as e:
+                    print(f"Reminder error: {e}")
+            # After the due reminders -> the ones fired are not pushed again
+            if clock.monotonic() >= next_refresh:
+                try:
+                    now = datetime.now()
+                    self.refresh(last_refresh, now)
+                    last_refresh = now
+                except Exception as e:
+                    print(f"Reminder refresh error: {e}")
+                next_refresh = clock.monotonic() + self.reload_interval
+
+reminder_scheduler = ReminderScheduler(
+    lead=timedelta(hours=float(os.environ.get("REMINDER_LEAD_HOURS", 24))),
+    reload_interval=float(os.environ.get("REMINDER_RELOAD_SECONDS", 60)),
+)
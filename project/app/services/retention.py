@@ -0,0 +1,223 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+from sqlalchemy import select, delete, and_, or_
+from sqlalchemy.orm import joinedload
+from ..database import Session
+from ..models.models import DossierCandidats, DetailsDossierCandidats, IdempotencyKeys, Reminders
+from ..cache import fragment_cache, DOSSIERS_TAG
+from .dashboard import move_dossier_aggregate
+from .stages import compute_stage
+from .reminders import reminder_scheduler
+
+# Folder of the uploaded images (see post_add_dossier)
+IMAGES_DIR = Path("static/images")
+# Images shipped with the application, never deleted even if no dossier uses them anymore
+PROTECTED_IMAGES = {"incognito.png", "image1.jpeg", "image2.jpg", "image3.jpg"}
+
+# Totals since the start of the process (exposed by the metrics endpoint)
+purge_metrics = {
+    "runs": 0,
+    "dossiers_purged": 0,
+    "images_deleted": 0,
+    "seconds": 0.0,
+    "last_run": None,
+}
+_metrics_lock = threading.Lock()
+
+def _image_file(image: Optional[str]) -> Optional[Path]:
+    """
+    Converts the image link stored in a dossier (../static/images/x.jpg) to the file path.
+    Returns None for links outside the images folder and for protected images.
+    """
+    if not image:
+        return None
+    name = Path(image).name
+    if name in PROTECTED_IMAGES or Path(image).parent.name != IMAGES_DIR.name:
+        return None
+    return IMAGES_DIR / name
+
+def purge_expired_dossiers(
+    now: Optional[datetime] = None,
+    batch_size: int = 100,
+    dry_run: bool = False,
+    max_batches: Optional[int] = None,
+    pause: float = 0.0,
+) -> dict:
+    """
+    Deletes the dossiers whose date_suppression_dossier is past, with their details and their orphaned images.
+    The dossiers are read with a range scan on the index of date_suppression_dossier and deleted
+    in batches, each batch in its own short transaction, so other requests are never blocked for long.
+
+    Args:
+        now (datetime): The reference date (default: now).
+        batch_size (int): The number of dossiers deleted per transaction.
+        dry_run (bool): Only count what would be deleted.
+        max_batches (int): Stop after this number of batches (None for no limit).
+        pause (float): Seconds to wait between two batches.
+
+    Returns:
+        dict: {'dossiers': number of dossiers purged, 'images': number of images deleted,
+               'batches': number of batches, 'seconds': time spent, 'dry_run': dry_run}
+    """
+    now = now or datetime.now()
+    start = time.perf_counter()
+    purged = 0
+    images_deleted = 0
+    batches = 0
+    # Keyset on (date_suppression_dossier, id) -> each batch continues the index scan
+    last_key = None
+
+    while max_batches is None or batches < max_batches:
+        with Session() as session:
+            query = (
+                select(DossierCandidats)
+                .join(DetailsDossierCandidats, DetailsDossierCandidats.dossier_id == DossierCandidats.id)
+                .options(joinedload(DossierCandidats.details))
+                .where(DetailsDossierCandidats.date_suppression_dossier < now)
+                .order_by(DetailsDossierCandidats.date_suppression_dossier, DetailsDossierCandidats.id)
+                .limit(batch_size)
+            )
+            if dry_run and last_key is not None:
+                # Nothing is deleted in dry run -> skip the rows already counted
+                query = query.where(or_(
+                    DetailsDossierCandidats.date_suppression_dossier > last_key[0],
+                    and_(DetailsDossierCandidats.date_suppression_dossier == last_key[0], DetailsDossierCandidats.id > last_key[1]),
+                ))
+            dossiers = session.scalars(query).unique().all()
+            if not dossiers:
+                break
+            batches += 1
+            last_key = (dossiers[-1].details.date_suppression_dossier, dossiers[-1].details.id)
+
+            ids = [dossier.id for dossier in dossiers]
+            images = {_image_file(dossier.image) for dossier in dossiers} - {None}
+            if not dry_run:
+                for dossier in dossiers:
+                    move_dossier_aggregate(session, (dossier.postereference, compute_stage(dossier.details)), None)
+                session.execute(delete(DetailsDossierCandidats).where(DetailsDossierCandidats.dossier_id.in_(ids)))
+                session.execute(delete(DossierCandidats).where(DossierCandidats.id.in_(ids)))
+                session.commit()
+                for dossier_id in ids:
+                    reminder_scheduler.unschedule(dossier_id)
+
+                # Delete the images no other dossier uses
+                still_used = set(session.scalars(
+                    select(DossierCandidats.image).where(DossierCandidats.image.in_([f"../static/images/{image.name}" for image in images]))
+                ))
+                for image in images:
+                    if f"../static/images/{image.name}" not in still_used and image.exists():
+                        image.unlink()
+                        images_deleted += 1
+            purged += len(dossiers)
+
+        if len(dossiers) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    if purged and not dry_run:
+        fragment_cache.invalidate_tag(DOSSIERS_TAG)
+
+    seconds = time.perf_counter() - start
+    if not dry_run:
+        with _metrics_lock:
+            purge_metrics["runs"] += 1
+            purge_metrics["dossiers_purged"] += purged
+            purge_metrics["images_deleted"] += images_deleted
+            purge_metrics["seconds"] += seconds
+            purge_metrics["last_run"] = now.isoformat()
+    return {'dossiers': purged, 'images': images_deleted, 'batches': batches, 'seconds': seconds, 'dry_run': dry_run}
+
+def purge_idempotency_keys(older_than: timedelta = timedelta(days=1), now: Optional[datetime] = None) -> int:
+    """
+    Deletes the idempotency keys of the create forms once no retry can use them anymore.
+
+    Returns:
+        int: The number of keys deleted.
+    """
+    now = now or datetime.now()
+    with Session() as session:
+        result = session.execute(delete(IdempotencyKeys).where(IdempotencyKeys.created_at < now - older_than))
+        session.commit()
+        return result.rowcount
+
+def purge_reminders(now: Optional[datetime] = None) -> int:
+    """
+    Deletes the reminders of the days that have passed (the candidate pages only show the coming ones).
+
+    Returns:
+        int: The number of reminders deleted.
+    """
+    today = datetime.combine((now or datetime.now()).date(), datetime.min.time())
+    with Session() as session:
+        result = session.execute(delete(Reminders).where(Reminders.date < today))
+        session.commit()
+        return result.rowcount
+
+def _in_office_hours(hour: int, office_hours: str) -> bool:
+    # office_hours: "8-18" -> from 8:00 to 17:59
+    start, end = (int(value) for value in office_hours.split("-"))
+    return start <= hour < end
+
+class RetentionWorker:
+    """
+    Background thread running purge_expired_dossiers every interval, outside office hours only.
+
+    Configuration (environment variables):
+        PURGE_ENABLED: "0" to disable the worker (default "1")
+        PURGE_INTERVAL_SECONDS: time between two runs (default 3600)
+        PURGE_BATCH_SIZE: dossiers deleted per transaction (default 100)
+        PURGE_OFFICE_HOURS: hours during which nothing is purged (default "8-18")
+        PURGE_DRY_RUN: "1" to only log what would be purged (default "0")
+    """
+
+    def __init__(self):
+        self.enabled = os.environ.get("PURGE_ENABLED", "1") == "1"
+        self.interval = float(os.environ.get("PURGE_INTERVAL_SECONDS", 3600))
+        self.batch_size = int(os.environ.get("PURGE_BATCH_SIZE", 100))
+        self.office_hours = os.environ.get("PURGE_OFFICE_HOURS", "8-18")
+        self.dry_run = os.environ.get("PURGE_DRY_RUN", "0") == "1"
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="retention-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        # The first run waits one interval -> the startup is not slowed down
+        while not self._stop.wait(self.interval):
+            if _in_office_hours(datetime.now().hour, self.office_hours):
+                continue
+            try:
+                report = purge_expired_dossiers(batch_size=self.batch_size, dry_run=self.dry_run, pause=0.05)
+                if not self.dry_run:
+                    purge_idempotency_keys()
+                    purge_reminders()
+                if report['dossiers']:
+                    print(f"Retention purge: {report}")
+            except Exception as e:
+                print(f"Retention purge error: {e}")
+
+retention_worker = RetentionWorker()
+
+if __name__ == "__main__":
+    # Manual run from the project folder: python -m app.services.retention [--dry-run]
+    import argparse
+    parser = argparse.ArgumentParser(description="Purge the dossiers past their deletion date.")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    print(purge_expired_dossiers(batch_size=args.batch_size, dry_run=args.dry_run))
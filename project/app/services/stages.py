@@ -0,0 +1,144 @@
+from datetime import datetime
+from typing import Optional
+from ..models.models import DetailsDossierCandidats
+
+# Stages of the recruitment pipeline, in order
+STAGE_MISSING_DETAILS = "missing_details"
+STAGE_INCOMPLETE = "incomplete"
+STAGE_COMPLETE = "complete"
+STAGE_AWAITING_COMMISSION = "awaiting_commission"
+STAGE_COMMISSION = "commission"
+STAGE_RANKED = "ranked"
+STAGE_AUTHORITIES = "authorities"
+STAGE_HIRED = "hired"
+STAGE_NOT_RETAINED = "not_retained"
+
+STAGES = [
+    STAGE_MISSING_DETAILS,
+    STAGE_INCOMPLETE,
+    STAGE_COMPLETE,
+    STAGE_AWAITING_COMMISSION,
+    STAGE_COMMISSION,
+    STAGE_RANKED,
+    STAGE_AUTHORITIES,
+    STAGE_HIRED,
+    STAGE_NOT_RETAINED,
+]
+
+# Labels of the stages shown by the templates (Jinja global stage_labels), per language
+STAGE_LABELS = {
+    "en": {
+        STAGE_MISSING_DETAILS: "Missing details",
+        STAGE_INCOMPLETE: "Incomplete",
+        STAGE_COMPLETE: "Complete",
+        STAGE_AWAITING_COMMISSION: "Awaiting committee",
+        STAGE_COMMISSION: "At the committee",
+        STAGE_RANKED: "Ranked",
+        STAGE_AUTHORITIES: "Sent to authorities",
+        STAGE_HIRED: "Hired",
+        STAGE_NOT_RETAINED: "Not retained",
+    },
+    "fr": {
+        STAGE_MISSING_DETAILS: "Détails manquants",
+        STAGE_INCOMPLETE: "Incomplet",
+        STAGE_COMPLETE: "Complet",
+        STAGE_AWAITING_COMMISSION: "En attente de la commission",
+        STAGE_COMMISSION: "En commission",
+        STAGE_RANKED: "Classé",
+        STAGE_AUTHORITIES: "Transmis aux autorités",
+        STAGE_HIRED: "Entrée en fonction",
+        STAGE_NOT_RETAINED: "Non retenu",
+    },
+}
+# A stage without label would render an empty cell -> checked at import
+for language, labels in STAGE_LABELS.items():
+    if set(labels) != set(STAGES):
+        raise RuntimeError(f"STAGE_LABELS[{language!r}] does not match STAGES")
+
+def compute_stage(details: Optional[DetailsDossierCandidats]) -> str:
+    """
+    Derives the pipeline stage of a dossier from the date fields of its details.
+    The stage only depends on the stored values (not on the current date),
+    so it can be maintained when the details are written.
+
+    Args:
+        details (DetailsDossierCandidats): The details of the dossier (None if missing).
+
+    Returns:
+        str: One of STAGES.
+    """
+    if details is None:
+        return STAGE_MISSING_DETAILS
+    # The forms store "yes"/"no"/"pending", older rows store a boolean ("1" once read back by SQLite)
+    if details.candidature_non_retenue in ("yes", "True", "1", True, 1):
+        return STAGE_NOT_RETAINED
+    if details.date_entree_fonction:
+        return STAGE_HIRED
+    if details.date_soumission_autorites or details.date_transmission_autorites:
+        return STAGE_AUTHORITIES
+    # 0 is the value of the empty ranking field of the older forms: not ranked
+    if details.position_classement:
+        return STAGE_RANKED
+    if details.date_reunion_commission or details.date_entendu:
+        return STAGE_COMMISSION
+    if details.date_transmission_commission:
+        return STAGE_AWAITING_COMMISSION
+    if details.dossier_complet:
+        return STAGE_COMPLETE
+    return STAGE_INCOMPLETE
+
+# Dates of the timeline, in the order of the pipeline
+TIMELINE_FIELDS = [
+    "date_cloture",
+    "date_reception",
+    "date_transmission_commission",
+    "date_reunion_commission",
+    "date_entendu",
+    "date_soumission_autorites",
+    "date_transmission_autorites",
+    "date_entree_fonction",
+    "date_suppression_dossier",
+]
+
+# First step of the timeline still to come at each stage (the meeting of the commission stage is planned ahead)
+STAGE_PENDING_FROM = {
+    STAGE_INCOMPLETE: "date_cloture",
+    STAGE_COMPLETE: "date_transmission_commission",
+    STAGE_AWAITING_COMMISSION: "date_reunion_commission",
+    STAGE_COMMISSION: "date_reunion_commission",
+    STAGE_RANKED: "date_soumission_autorites",
+    STAGE_AUTHORITIES: "date_entree_fonction",
+    STAGE_HIRED: "date_suppression_dossier",
+    STAGE_NOT_RETAINED: "date_suppression_dossier",
+}
+
+def compute_next_deadline(details: Optional[DetailsDossierCandidats], stage: str) -> Optional[datetime]:
+    """
+    Earliest date of the steps of the timeline not finished at the stage of the dossier.
+    Like the stage it does not depend on the current date: a past next deadline means the dossier is late.
+
+    Args:
+        details (DetailsDossierCandidats): The details of the dossier (None if missing).
+        stage (str): The stage of the dossier (see compute_stage).
+
+    Returns:
+        datetime: The date, None if no date of these steps is set.
+    """
+    if details is None or stage not in STAGE_PENDING_FROM:
+        return None
+    fields = TIMELINE_FIELDS[TIMELINE_FIELDS.index(STAGE_PENDING_FROM[stage]):]
+    dates = [getattr(details, field) for field in fields if getattr(details, field) is not None]
+    return min(dates, default=None)
+
+def stage_columns(details) -> dict:
+    """
+    Values of the derived columns of the details (stage, next_deadline), set on every write of the details.
+
+    Args:
+        details: The details (ORM object or any object with their attributes).
+
+    Returns:
+        dict: {"stage": str, "next_deadline": datetime or None}
+    """
+    stage = compute_stage(details)
+    return {"stage": stage, "next_deadline": compute_next_deadline(details, stage)}
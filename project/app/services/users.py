@@ -1,11 +1,11 @@
 from typing import Optional
 from pydantic import ValidationError
-from sqlalchemy import select
+from sqlalchemy import select, func, or_, delete, exists, insert, update
 import hashlib
 
-from ..schemas.users import UserSchema, AdminSchema
-from ..database import Session
-from ..models.models import Users, Admins
+from ..schemas.users import UserSchema, AdminSchema, UserRow
+from ..database import Session, read_only
+from ..models.models import Users, Admins, Secretariats, respRecrutements
 from ..errors import ChangeMdpError
 
 import smtplib
@@ -60,6 +60,7 @@ def send_confirmation_email(to_email: str):
     except Exception as e:
         print(f"Erreur lors de l'envoi de l'e-mail : {e}")
         
+@read_only
 def get_user_notification(user_id: str) -> Optional[str]:
     """
     Récupère la notification d'un utilisateur par son ID.
@@ -71,6 +72,7 @@ def get_user_notification(user_id: str) -> Optional[str]:
         user = session.query(Users).filter_by(id=user_id).first()
         return user.notification if user else None
 
+# Not @read_only: login, registration and the rights of the session are read on the primary
 def get_user_by_email(email: str):
     """
     This function retrieves a user by email.
@@ -91,6 +93,7 @@ def get_user_by_email(email: str):
             return user
     return None
 
+# Not @read_only: loads the user of every request (group, whitelist) -> no replica lag on the rights
 def get_user_by_id(id: str):
     """
     This function retrieves a user by ID.
@@ -152,6 +155,7 @@ def add_admin(admin: AdminSchema):
         session.add(admin_entity)  # Add admin to database
         session.commit()
 
+@read_only
 def get_all_users() -> list[Users]:
     """
     This function retrieves all users.
@@ -169,6 +173,161 @@ def get_all_users() -> list[Users]:
             for user in users_data
         ]
 
+# Columns the admin user list can be sorted by
+USER_SORT_COLUMNS = {
+    "username": Users.username, "name": Users.name, "surname": Users.surname, "email": Users.email, "group": Users.group,
+}
+# Largest page of the admin user list, whatever the number of users
+USERS_MAX_PER_PAGE = 100
+
+def user_filters(group: Optional[str] = None, whitelist: Optional[bool] = None, search: Optional[str] = None) -> list:
+    """
+    This function builds the WHERE clauses of the admin user list.
+
+    Parameters:
+    -----------
+    group : Only the users of this group (str)
+    whitelist : Only the allowed (True) or blocked (False) users (bool)
+    search : Text searched in the username, name, surname and email, case insensitive (str)
+
+    Returns:
+    --------
+    filters : The clauses, to give to where() (list)
+    """
+    filters = []
+    if group:
+        filters.append(Users.group == group)
+    if whitelist is not None:
+        filters.append(Users.whitelist == whitelist)
+    if search:
+        # % and _ typed by the admin are searched as such
+        pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        filters.append(or_(*(column.ilike(pattern, escape="\\") for column in (Users.username, Users.name, Users.surname, Users.email))))
+    return filters
+
+@read_only
+def get_users_page(
+    page: int = 1,
+    per_page: int = 25,
+    group: Optional[str] = None,
+    whitelist: Optional[bool] = None,
+    search: Optional[str] = None,
+    sort: str = "username",
+    descending: bool = False,
+) -> tuple:
+    """
+    This function retrieves one page of the admin user list.
+
+    Parameters:
+    -----------
+    page : The page number, from 1 (int)
+    per_page : The number of users per page, at most USERS_MAX_PER_PAGE (int)
+    group, whitelist, search : The filters (see user_filters)
+    sort : The column to sort by, a key of USER_SORT_COLUMNS (str)
+    descending : Sort in descending order (bool)
+
+    Returns:
+    --------
+    (users, total) : The users of the page (list of UserRow) and the number of users matching the filters (int)
+    """
+    per_page = min(per_page, USERS_MAX_PER_PAGE)
+    filters = user_filters(group, whitelist, search)
+    column = USER_SORT_COLUMNS.get(sort, Users.username)
+    with Session() as session:
+        total = session.scalar(select(func.count()).select_from(Users).where(*filters))
+        # The id breaks the ties: a user is never on two pages
+        rows = session.execute(
+            select(Users.id, Users.username, Users.name, Users.surname, Users.email, Users.group, Users.whitelist)
+            .where(*filters)
+            .order_by(column.desc() if descending else column, Users.id)
+            .offset((page - 1) * per_page)
+            .limit(per_page)
+        ).all()
+    return [UserRow(*row) for row in rows], total
+
+@read_only
+def get_user_groups() -> list[str]:
+    """
+    This function retrieves the groups used by at least one user (read from the index on the group).
+
+    Returns:
+    --------
+    groups : The sorted group names (list of str)
+    """
+    with Session() as session:
+        return list(session.scalars(select(Users.group).distinct().order_by(Users.group)))
+
+# Role table of the groups that have one (both spellings used by the forms and the seed data)
+ROLE_TABLES = {
+    "admin": Admins,
+    "secretariat": Secretariats, "Secrétariat": Secretariats,
+    "respRecrutement": respRecrutements, "responsable": respRecrutements,
+}
+
+def _bulk_conditions(ids: Optional[list], filters: Optional[list], exclude: Optional[str]) -> list:
+    # Users targeted by a bulk change: the given ids and/or the filters of the user list
+    conditions = list(filters or [])
+    if ids is not None:
+        conditions.append(Users.id.in_(ids))
+    if exclude is not None:
+        conditions.append(Users.id != exclude)
+    return conditions
+
+def set_users_group(group: str, ids: Optional[list] = None, filters: Optional[list] = None, exclude: Optional[str] = None) -> int:
+    """
+    This function sets the group of many users in a single transaction, with set-based statements:
+    the role tables (admins, secretariats, respRecrutements) are updated for all the users at once.
+
+    Parameters:
+    -----------
+    group : The group to be assigned to the users (str)
+    ids : Only these users (list of str)
+    filters : Only the users matching these clauses (list, see user_filters)
+    exclude : A user never changed, ex: the admin doing the change (str)
+
+    Returns:
+    --------
+    count : The number of users changed (int)
+    """
+    conditions = _bulk_conditions(ids, filters, exclude)
+    targets = select(Users.id).where(*conditions)
+    role = ROLE_TABLES.get(group)
+    with Session() as session:
+        # The role rows first: the filters may be on the group being changed
+        for table in set(ROLE_TABLES.values()):
+            if table is not role:
+                session.execute(delete(table).where(table.user_id.in_(targets)).execution_options(synchronize_session=False))
+        if role is not None:
+            session.execute(insert(role).from_select(
+                ["user_id"], select(Users.id).where(*conditions, ~exists().where(role.user_id == Users.id))
+            ))
+        count = session.execute(
+            update(Users).where(*conditions).values(group=group).execution_options(synchronize_session=False)
+        ).rowcount
+        session.commit()
+    return count
+
+def set_users_whitelist(whitelist: bool, ids: Optional[list] = None, filters: Optional[list] = None, exclude: Optional[str] = None) -> int:
+    """
+    This function sets the whitelist status of many users with a single UPDATE.
+
+    Parameters:
+    -----------
+    whitelist : The whitelist status to be set (bool)
+    ids, filters, exclude : The users to change (see set_users_group)
+
+    Returns:
+    --------
+    count : The number of users changed (int)
+    """
+    with Session() as session:
+        count = session.execute(
+            update(Users).where(*_bulk_conditions(ids, filters, exclude)).values(whitelist=whitelist)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        session.commit()
+    return count
+
 def set_user_group(id: str, group: str):
     """
     This function sets the group of a user.
@@ -178,26 +337,7 @@ def set_user_group(id: str, group: str):
     id : The ID of the user (str)
     group : The group to be assigned to the user (str)
     """
-    with Session() as session:
-        if group == "admin":
-            # We add user in Admin table
-            admin = Admins(
-                user_id=id,
-            )
-            session.add(admin)
-            session.commit()
-        else:
-            # We remove user from Admin table
-            statement = select(Admins).filter_by(user_id=id)
-            admin = session.scalar(statement)
-            session.delete(admin)
-            session.commit()
-
-        # We also update group attribute in User table
-        statement = select(Users).filter_by(id=id)
-        user = session.scalar(statement)
-        user.group = group
-        session.commit()
+    set_users_group(group, ids=[id])
 
 def set_user_whitelist(id: str, whitelist: bool):
     """
@@ -208,12 +348,7 @@ def set_user_whitelist(id: str, whitelist: bool):
     id : The ID of the user (str)
     whitelist : The whitelist status to be set (bool)
     """
-    with Session() as session:
-        statement = select(Users).filter_by(id=id)
-        user = session.scalar(statement)
-        # We update the whitelist attribute of the user to the wanted value
-        user.whitelist = whitelist
-        session.commit()
+    set_users_whitelist(whitelist, ids=[id])
 
 def change_user_password(id: str, password: str):
     """
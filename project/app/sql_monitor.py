@@ -0,0 +1,111 @@
+"""
+Instrumentation of the SQL queries, through the SQLAlchemy cursor events.
+
+For every query: the time goes to the db_query_duration_seconds histogram and to the stats of
+the current request (count, total time, slowest statements, N+1 patterns), shown in /metrics
+and in the X-DB-Stats header (SQL_DEBUG=1, see app/metrics.py).
+The queries slower than SLOW_QUERY_MS are printed with their query plan.
+"""
+from collections import OrderedDict
+from threading import Lock
+import os
+import time
+
+from sqlalchemy import event
+
+from app.metrics import Counter, Histogram, current_request, register
+
+# Queries slower than this are logged with their query plan (0 -> disabled)
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 200))
+# Same statement executed this many times in one request -> N+1 pattern (ex: one query per dossier of a list)
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("N_PLUS_ONE_THRESHOLD", 5))
+# Slowest statements kept per request
+KEEP_SLOWEST = 3
+
+# EXPLAIN syntax per dialect (the plan is not printed for the others)
+EXPLAIN_PREFIXES = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN ", "mysql": "EXPLAIN "}
+
+query_duration = register(Histogram("db_query_duration_seconds", "SQL statement latency.", ("engine",)))
+slow_queries = register(Counter("db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS.", ("engine",)))
+
+# Statements whose plan was already printed (the plan of a statement does not change between two calls)
+_explained = OrderedDict()
+_explained_lock = Lock()
+
+def instrument_queries(engine, name: str):
+    """
+    Times the queries of an engine.
+
+    Args:
+        engine: The SQLAlchemy engine.
+        name (str): The engine label in /metrics (primary, replica).
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query(connection, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - connection.info["query_start"].pop()
+        query_duration.observe(elapsed, name)
+        stats = current_request.get()
+        if stats is not None:
+            record(stats, statement, elapsed)
+        if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+            slow_queries.inc(name)
+            log_slow_query(connection, statement, parameters, elapsed, executemany)
+
+    @event.listens_for(engine, "handle_error")
+    def failed_query(context):
+        # after_cursor_execute is not called for a failed query
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+def record(stats, statement: str, elapsed: float):
+    """
+    Adds a query to the stats of the current request.
+    """
+    stats.queries += 1
+    stats.db_time += elapsed
+    count = stats.statements.get(statement, 0) + 1
+    stats.statements[statement] = count
+    if count == N_PLUS_ONE_THRESHOLD:
+        stats.n_plus_one.append(statement)
+    if len(stats.slowest) < KEEP_SLOWEST or elapsed > stats.slowest[-1][0]:
+        stats.slowest.append((elapsed, statement))
+        stats.slowest.sort(key=lambda item: item[0], reverse=True)
+        del stats.slowest[KEEP_SLOWEST:]
+
+def explain(connection, statement: str, parameters) -> list:
+    """
+    Returns the query plan of a statement (one line per step), on a separate cursor
+    so the rows of the original query are not lost.
+    """
+    prefix = EXPLAIN_PREFIXES.get(connection.dialect.name)
+    if prefix is None or not statement.lstrip().upper().startswith(("SELECT", "WITH", "UPDATE", "DELETE")):
+        return []
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        # SQLite: (id, parent, notused, detail), PostgreSQL: (plan line,)
+        return [str(row[-1]) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+def log_slow_query(connection, statement: str, parameters, elapsed: float, executemany: bool):
+    print(f"Slow query {elapsed * 1000:.1f} ms: {' '.join(statement.split())[:1000]}")
+    with _explained_lock:
+        if statement in _explained:
+            return
+        _explained[statement] = True
+        if len(_explained) > 256:
+            _explained.popitem(last=False)
+    if executemany:
+        return
+    try:
+        for line in explain(connection, statement, parameters):
+            print(f"    {line}")
+    except Exception as e:
+        print(f"    (no query plan: {e})")
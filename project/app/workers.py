@@ -0,0 +1,63 @@
+import os
+import threading
+from typing import Callable
+
+# Kept open by the process running the background jobs (the lock is released when the process exits)
+_background_lock = None
+_stopped = threading.Event()
+
+def acquire_background_jobs(path: str = "data/background.lock") -> bool:
+    """
+    Elects the process running the background jobs (retention purge, reminders).
+    With several workers only one of them gets the lock; it is released when that worker exits.
+
+    Returns:
+        bool: True if this process must run the background jobs.
+    """
+    global _background_lock
+    if _background_lock is not None:
+        return True
+    try:
+        import fcntl
+    except ImportError:
+        # Windows -> single process (main.py)
+        return True
+    # "a" -> the processes that do not get the lock do not truncate the file
+    lock_file = open(path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    lock_file.truncate(0)
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    _background_lock = lock_file
+    return True
+
+def start_background_jobs(start: Callable, retry_interval: float = 5):
+    """
+    Calls start() in the process elected by acquire_background_jobs.
+    The other workers keep trying in a thread: on a graceful reload (kill -HUP) the new workers
+    start before the old ones exit, the first one to get the lock then takes the jobs over.
+
+    Args:
+        start (Callable): Starts the background jobs.
+        retry_interval (float): Seconds between two attempts.
+    """
+    _stopped.clear()
+    if acquire_background_jobs():
+        start()
+        return
+
+    def retry():
+        while not _stopped.wait(retry_interval):
+            if acquire_background_jobs():
+                start()
+                return
+
+    threading.Thread(target=retry, name="background-election", daemon=True).start()
+
+def stop_background_jobs():
+    # Stops the retry thread of start_background_jobs
+    _stopped.set()
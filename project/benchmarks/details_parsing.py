@@ -0,0 +1,106 @@
+"""
+Compares the parsing of the details fields: the previous code (one strptime per date field, string
+comparisons for the flags) and the schema-driven parser, for full forms and for a batch of partial updates
+(the same few fields on every row, ex: after a committee meeting), row by row or column by column.
+
+Usage (from the project folder):
+    python -m benchmarks.details_parsing --rows 50000
+
+No database is used.
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+
+from app.schemas.folder import DETAILS_INPUT_FIELDS, DetailsInput, non_retenue_value
+from app.services.folder import parse_details, parse_details_columns
+
+DATE_FIELDS = [field for field, (kind, default) in DETAILS_INPUT_FIELDS.items() if field.startswith("date_")]
+
+def legacy_form(values: dict) -> dict:
+    # Code of update_dossier_details before the parser
+    parsed = {field: datetime.strptime(values[field], '%Y-%m-%d') if values.get(field) else None for field in DATE_FIELDS}
+    parsed["dossier_complet"] = values.get("dossier_complet") == "True"
+    parsed["confirmation_information"] = values.get("confirmation_information") == "True"
+    parsed["candidature_non_retenue"] = non_retenue_value(values.get("candidature_non_retenue"))
+    parsed["position_classement"] = values.get("position_classement")
+    return parsed
+
+def legacy_batch(changes: dict) -> dict:
+    # Code of update_details_batch before the parser: every value of every row converted on its own
+    parsed = {}
+    for dossier_id, values in changes.items():
+        row = parsed[dossier_id] = {}
+        for field, value in values.items():
+            if field in DATE_FIELDS:
+                row[field] = datetime.strptime(value, '%Y-%m-%d') if value else None
+            elif field == "position_classement":
+                row[field] = int(value) if value not in (None, "") else None
+            else:
+                row[field] = non_retenue_value(value)
+    return parsed
+
+def forms(rows: int, seed: int) -> list:
+    """
+    Form values as sent by the browser: dates as 'YYYY-MM-DD' (some empty), flags as "True"/"False".
+    """
+    rng = random.Random(seed)
+    items = []
+    for _ in range(rows):
+        values = {
+            field: "" if rng.random() < 0.3 else f"{rng.randint(2023, 2026)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            for field in DATE_FIELDS
+        }
+        values.update(
+            dossier_complet=rng.choice(["True", "False"]), confirmation_information=rng.choice(["True", "False"]),
+            candidature_non_retenue=rng.choice(["yes", "no", "Pending"]), position_classement=rng.randint(1, 20),
+        )
+        items.append(values)
+    return items
+
+def meeting(rows: int, seed: int) -> dict:
+    """
+    Partial updates of the batch API: a few meeting dates, a ranking and a status per dossier.
+    """
+    rng = random.Random(seed)
+    dates = [f"2025-{month:02d}-15" for month in range(1, 13)]
+    return {str(i): {
+        "date_reunion_commission": rng.choice(dates), "position_classement": rng.randint(1, 20),
+        "candidature_non_retenue": rng.choice(["yes", "no", "pending"]),
+    } for i in range(rows)}
+
+def measure(name: str, function, rows: int):
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<34} {rows / elapsed:>12,.0f} rows/s  {elapsed * 1e6 / rows:>8.2f} µs/row")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    items = forms(args.rows, args.seed)
+    changes = {str(i): values for i, values in enumerate(items)}
+    updates = meeting(args.rows, args.seed)
+
+    # Same result for all the paths
+    parsed, errors = parse_details_columns(changes)
+    assert not errors
+    for i, values in enumerate(items[:1000]):
+        assert legacy_form(values) == parse_details(**values) == {**DetailsInput().model_dump(), **parsed[str(i)]}
+    assert legacy_batch(updates) == parse_details_columns(updates)[0]
+
+    print(f"{args.rows} full forms, {len(DETAILS_INPUT_FIELDS)} fields")
+    measure("strptime (previous)", lambda: [legacy_form(values) for values in items], args.rows)
+    measure("parse_details", lambda: [parse_details(**values) for values in items], args.rows)
+    measure("DetailsInput per row", lambda: [DetailsInput(**values) for values in items], args.rows)
+    measure("parse_details_columns", lambda: parse_details_columns(changes), args.rows)
+    print(f"\n{args.rows} partial updates, 3 fields")
+    measure("strptime per value (previous)", lambda: legacy_batch(updates), args.rows)
+    measure("DetailsInput per row", lambda: [DetailsInput(**values).model_dump(exclude_unset=True) for values in updates.values()], args.rows)
+    measure("parse_details_columns", lambda: parse_details_columns(updates), args.rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compares the ORM path and the DossierRow projection used by the list pages.
+
+Usage (from the project folder):
+    python -m benchmarks.list_projection --dossiers 20000 --per-page 10 --pages 200
+
+The benchmark works on a temporary SQLite database, data/db.sqlite is never touched.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from uuid import uuid4
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import joinedload
+
+from app.database import Session
+from app.models.models import Base, DossierCandidats, DetailsDossierCandidats, Users
+from app.services.folder import get_dossier_rows
+from app.services.stages import STAGE_COMPLETE
+
+def seed(engine, dossiers: int):
+    """
+    Inserts one user and the given number of dossiers (half of them with details).
+    """
+    user_id = str(uuid4())
+    with engine.begin() as connection:
+        connection.execute(insert(Users), [{
+            "id": user_id, "username": "bench", "name": "Bench", "surname": "Bench", "password": "",
+            "email": "bench@example.com", "group": "candidat", "whitelist": True, "notification": "",
+        }])
+        rows = [{
+            "id": str(uuid4()), "username": f"user{i}", "name": f"Name{i}", "mail": f"user{i}@example.com",
+            "postereference": f"Z{i % 50:08d}", "profref": "Mr.Bench", "phonenumber": "+32470000000",
+            "image": "../static/images/incognito.png", "user_id": user_id, "version": 1,
+        } for i in range(dossiers)]
+        connection.execute(insert(DossierCandidats), rows)
+        connection.execute(insert(DetailsDossierCandidats), [{
+            "dossier_id": row["id"], "date_cloture": datetime(2025, 12, 31), "dossier_complet": True,
+            "confirmation_information": False, "stage": STAGE_COMPLETE, "version": 1,
+        } for row in rows[::2]])
+
+def orm_page(page: int, per_page: int):
+    # Same query as the list routes before the projection
+    with Session() as session:
+        return session.query(DossierCandidats).options(joinedload(DossierCandidats.details)).offset((page - 1) * per_page).limit(per_page).all()
+
+def projection_page(page: int, per_page: int):
+    return get_dossier_rows(page, per_page)
+
+def measure(name: str, load_page, pages: int, per_page: int, total_pages: int):
+    # Speed
+    rows = 0
+    start = time.perf_counter()
+    for i in range(pages):
+        rows += len(load_page(i % total_pages + 1, per_page))
+    elapsed = time.perf_counter() - start
+
+    # Memory of one page (kept alive like the template context)
+    tracemalloc.start()
+    page = load_page(1, per_page)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del page
+
+    print(f"{name:<12} {rows / elapsed:>12.0f} rows/s {elapsed / pages * 1000:>8.2f} ms/page "
+          f"{current / 1024:>8.1f} KiB kept {peak / 1024:>8.1f} KiB peak")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dossiers", type=int, default=20000)
+    parser.add_argument("--per-page", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.sqlite')}")
+        Base.metadata.create_all(engine)
+        seed(engine, args.dossiers)
+        Session.configure(bind=engine)
+
+        total_pages = max(1, args.dossiers // args.per_page)
+        print(f"{args.dossiers} dossiers, {args.per_page} per page, {args.pages} pages")
+        measure("orm", orm_page, args.pages, args.per_page, total_pages)
+        measure("projection", projection_page, args.pages, args.per_page, total_pages)
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
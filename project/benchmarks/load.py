@@ -0,0 +1,232 @@
+"""
+Load test of the main user journeys: login, dossier list, search, detail page, add, modify and export.
+
+Usage (from the project folder):
+    python -m benchmarks.load --dossiers 5000 --requests 300 --concurrency 8
+    python -m benchmarks.load --mode http --save results.json
+    python -m benchmarks.load --baseline results.json
+
+--mode inprocess (default) drives the ASGI app in the same process (httpx ASGITransport): no network,
+the numbers show the cost of the application code. --mode http starts uvicorn (or serve.py with
+--server serve) on a free port and sends real HTTP requests; --url targets a server already running.
+
+The runs work on a temporary SQLite database generated with the given volumes (benchmarks/datagen.py)
+or on --database, data/db.sqlite is never touched. Every journey reports its throughput and its p50/p95/p99 latencies;
+--save writes them as JSON and --baseline compares the run with a saved one.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+import httpx
+
+BENCH_PASSWORD = "bench"
+
+def browser_form(fields: dict, empty_file: str) -> (bytes, str):
+    """
+    Multipart body sent by a browser for a form whose file input is left empty (filename="").
+    httpx leaves out the filename of an empty file, which the route rejects.
+    """
+    boundary = "----benchmark" + uuid4().hex
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n' for name, value in fields.items()]
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{empty_file}"; filename=""\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n\r\n--{boundary}--\r\n')
+    return "".join(parts).encode(), f"multipart/form-data; boundary={boundary}"
+
+class Journeys:
+    """
+    The requests of every journey, built from the seeded data.
+    """
+
+    def __init__(self, email: str, dossier_ids: list, mails: list, per_page: int = 10):
+        self.email = email
+        self.dossier_ids = dossier_ids
+        self.mails = mails
+        self.pages = max(1, len(dossier_ids) // per_page)
+        self.run_id = uuid4().hex[:8]
+
+    async def login(self, client, i):
+        return await client.post("/en/login", data={"email": self.email, "password": BENCH_PASSWORD})
+
+    async def list(self, client, i):
+        return await client.get("/en/dossier", params={"page": i % self.pages + 1})
+
+    async def search(self, client, i):
+        return await client.post("/en/dossier/search", data={"keyword": self.mails[i % len(self.mails)]})
+
+    async def detail(self, client, i):
+        return await client.get(f"/en/dossier/{self.dossier_ids[i % len(self.dossier_ids)]}")
+
+    async def add(self, client, i):
+        fields = {
+            "username": f"load{i}", "name": f"Load{i}", "mail": f"load-{self.run_id}-{i}@example.com",
+            "postereference": f"L{i % 20:08d}", "profref": "Mr.Load", "phonenumber": "+32470000000",
+        }
+        body, content_type = browser_form(fields, "image")
+        return await client.post("/en/dossier/new/add", content=body, headers={"Content-Type": content_type})
+
+    async def modify(self, client, i):
+        return await client.post(f"/en/modify_detail/{self.dossier_ids[i % len(self.dossier_ids)]}", data={
+            "mail": f"cand-mod-{self.run_id}-{i}@example.com", "phonenumber": "+32470000001",
+            "date_cloture": "2026-01-15", "date_reception": "2026-01-02", "dossier_complet": "True",
+            "candidature_non_retenue": "no", "confirmation_information": "False", "date_suppression_dossier": "2028-01-15",
+        })
+
+    async def export(self, client, i):
+        return await client.get("/en/dossier/export/excel")
+
+def percentile(values: list, share: float) -> float:
+    # Nearest rank on sorted values
+    return values[min(len(values) - 1, max(0, round(share * len(values)) - 1))]
+
+async def run_journey(client, journey, requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await journey(client, i)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": requests, "errors": errors, "throughput": requests / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000, "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+async def run_all(client_options: dict, journeys: Journeys, names: list, requests: int, export_requests: int, concurrency: int) -> dict:
+    async with httpx.AsyncClient(timeout=60, **client_options) as client:
+        # Session cookie for the other journeys
+        response = await journeys.login(client, 0)
+        if response.status_code != 302 or "auth_cookie" not in response.cookies:
+            raise SystemExit(f"Login failed: {response.status_code}")
+        results = {}
+        for name in names:
+            count = export_requests if name == "export" else requests
+            results[name] = await run_journey(client, getattr(journeys, name), count, concurrency)
+            print_result(name, results[name])
+        return results
+
+def print_result(name: str, result: dict, baseline: dict = None):
+    line = (f"{name:<8} {result['throughput']:>9.1f} req/s  p50 {result['p50_ms']:>8.1f} ms  "
+            f"p95 {result['p95_ms']:>8.1f} ms  p99 {result['p99_ms']:>8.1f} ms  errors {result['errors']}")
+    if baseline:
+        change = (result["p50_ms"] / baseline["p50_ms"] - 1) * 100 if baseline["p50_ms"] else 0
+        line += f"  (p50 {change:+.1f}% vs baseline)"
+    print(line)
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(server: str, env: dict) -> (subprocess.Popen, str):
+    port = free_port()
+    env = {**env, "HOST": "127.0.0.1", "PORT": str(port), "PURGE_ENABLED": "0"}
+    if server == "serve":
+        command = [sys.executable, "serve.py"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "app.app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            if httpx.get(f"{url}/health").status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.terminate()
+    raise SystemExit("The server did not start")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--dossiers", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the generated data")
+    parser.add_argument("--database", help="SQLite file to use (generated if it does not exist), kept after the run")
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--server", choices=["uvicorn", "serve"], default="uvicorn", help="server started by --mode http")
+    parser.add_argument("--url", help="--mode http against a server already running (its own database)")
+    parser.add_argument("--journeys", default="login,list,search,detail,add,modify,export")
+    parser.add_argument("--requests", type=int, default=300, help="requests per journey")
+    parser.add_argument("--export-requests", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results saved by --save")
+    args = parser.parse_args()
+    names = [name.strip() for name in args.journeys.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.database or os.path.join(tmp, "bench.sqlite")
+        url = f"sqlite:///{path}"
+        # The app modules create their engine from DATABASE_URL when they are imported
+        os.environ["DATABASE_URL"] = url
+        os.environ.pop("DATABASE_REPLICA_URL", None)
+        from sqlalchemy import create_engine, select
+        from app.models.models import DossierCandidats
+        from benchmarks.datagen import ADMIN_EMAIL, generate
+        if args.url is None and not os.path.exists(path):
+            print(f"Generating {args.users} users, {args.dossiers} dossiers")
+            generate(url, users=args.users, dossiers=args.dossiers, seed=args.seed, password=BENCH_PASSWORD)
+
+        if args.url is None:
+            engine = create_engine(url)
+            with engine.connect() as connection:
+                rows = connection.execute(select(DossierCandidats.id, DossierCandidats.mail).limit(1000)).all()
+            engine.dispose()
+            journeys = Journeys(ADMIN_EMAIL, [row.id for row in rows], [row.mail for row in rows])
+        else:
+            # Unknown data: only the journeys that do not need ids (pass --journeys)
+            journeys = Journeys(ADMIN_EMAIL, ["unknown"], ["unknown@example.com"])
+
+        process = None
+        if args.mode == "http":
+            if args.url is None:
+                process, base_url = start_server(args.server, dict(os.environ))
+            else:
+                base_url = args.url
+            client_options = {"base_url": base_url}
+        else:
+            from app.app import app
+            client_options = {"transport": httpx.ASGITransport(app=app, raise_app_exceptions=False), "base_url": "http://testserver"}
+
+        print(f"{args.mode}: {args.requests} requests per journey, concurrency {args.concurrency}")
+        try:
+            results = asyncio.run(run_all(client_options, journeys, names, args.requests, args.export_requests, args.concurrency))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    run = {"mode": args.mode, "users": args.users, "dossiers": args.dossiers, "concurrency": args.concurrency, "results": results}
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        print("\nCompared with the baseline:")
+        for name, result in results.items():
+            print_result(name, result, baseline.get(name))
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(run, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Microbenchmarks of the services layer: every case calls one service function against generated
+databases of several sizes and reports min/median/mean/stddev of its calls.
+
+Usage (from the project folder):
+    python -m benchmarks.services --sizes 1000,10000,50000 --save baseline.json
+    python -m benchmarks.services --sizes 1000,10000,50000 --baseline baseline.json --threshold 20
+
+A size is a number of dossiers (with a tenth as many users), generated by benchmarks/datagen.py
+in a temporary folder or in --data-dir, where the databases are kept and reused by the next runs.
+--save writes the results as JSON; --baseline compares the medians with a saved run and exits with
+status 1 when a case is more than --threshold percent slower.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, func, select
+
+from app.database import Session
+from app.models.models import DetailsDossierCandidats, DossierCandidats, Users
+from app.services.folder import get_dossiers_by_candidat, search_dossiers, update_dossier_details
+from app.services.users import get_all_users
+from benchmarks.datagen import generate
+
+def cases(engine) -> dict:
+    """
+    The benchmarked calls, with arguments taken from the generated data.
+
+    Returns:
+        dict: {case name: function called with the number of the call}
+    """
+    with engine.connect() as connection:
+        dossier = connection.execute(
+            select(DossierCandidats.id, DossierCandidats.mail, DossierCandidats.postereference)
+            .join(DetailsDossierCandidats, DetailsDossierCandidats.dossier_id == DossierCandidats.id)
+            .order_by(DossierCandidats.id).limit(100)
+        ).all()
+        # The owner with the most dossiers, the worst case of the candidate home page
+        owner = connection.execute(
+            select(DossierCandidats.user_id).group_by(DossierCandidats.user_id)
+            .order_by(func.count().desc(), DossierCandidats.user_id).limit(1)
+        ).scalar_one()
+        # The most common position reference (Zipf law), the widest search
+        position = connection.execute(
+            select(DossierCandidats.postereference).group_by(DossierCandidats.postereference)
+            .order_by(func.count().desc(), DossierCandidats.postereference).limit(1)
+        ).scalar_one()
+
+    def update(i):
+        row = dossier[i % len(dossier)]
+        # Same values on every call: the database stays the same between two runs
+        return update_dossier_details(
+            row.id, row.mail, "+32470000000", "2025-01-15", "2025-01-02", "True",
+            date_transmission_commission="2025-02-01", candidature_non_retenue="pending",
+            confirmation_information="False", date_suppression_dossier="2027-01-15",
+        )
+
+    return {
+        "search_dossiers[mail]": lambda i: search_dossiers(dossier[i % len(dossier)].mail),
+        "search_dossiers[position]": lambda i: search_dossiers(position),
+        "search_dossiers[miss]": lambda i: search_dossiers("nobody@example.com"),
+        "get_dossiers_by_candidat": lambda i: get_dossiers_by_candidat(owner, 1, 10),
+        "update_dossier_details": update,
+        "get_all_users": lambda i: get_all_users(),
+    }
+
+def measure(call, rounds: int, warmup: int, min_time: float) -> dict:
+    """
+    Times the calls of a case: warmup calls first, then at least `rounds` calls and `min_time` seconds.
+    """
+    for i in range(warmup):
+        call(i)
+    times = []
+    started = time.perf_counter()
+    while len(times) < rounds or time.perf_counter() - started < min_time:
+        start = time.perf_counter()
+        call(len(times))
+        times.append(time.perf_counter() - start)
+    return {
+        "rounds": len(times),
+        "min_ms": min(times) * 1000,
+        "median_ms": statistics.median(times) * 1000,
+        "mean_ms": statistics.fmean(times) * 1000,
+        "stddev_ms": statistics.stdev(times) * 1000 if len(times) > 1 else 0.0,
+    }
+
+def database(folder: str, size: int, seed: int) -> str:
+    """
+    URL of the generated database of a size, generated on the first use.
+    """
+    path = os.path.join(folder, f"services-{size}-{seed}.sqlite")
+    url = f"sqlite:///{path}"
+    if not os.path.exists(path):
+        print(f"Generating {max(1, size // 10)} users, {size} dossiers")
+        generate(url, users=max(1, size // 10), dossiers=size, seed=seed)
+    return url
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Returns:
+        list: The cases whose median is more than `threshold` percent above the baseline one.
+    """
+    regressions = []
+    for key, stats in results.items():
+        before = baseline.get(key)
+        if before is None or not before["median_ms"]:
+            continue
+        change = (stats["median_ms"] / before["median_ms"] - 1) * 100
+        print(f"{key:<45} {before['median_ms']:>9.3f} -> {stats['median_ms']:>9.3f} ms  {change:+6.1f}%")
+        if change > threshold:
+            regressions.append(key)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,50000", help="numbers of dossiers of the databases")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the generated data")
+    parser.add_argument("--data-dir", help="folder where the databases are kept between two runs")
+    parser.add_argument("--cases", help="only these cases (comma separated prefixes, ex: search_dossiers,get_all_users)")
+    parser.add_argument("--rounds", type=int, default=20, help="minimum calls per case")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--min-time", type=float, default=0.5, help="minimum seconds per case")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results saved by --save")
+    parser.add_argument("--threshold", type=float, default=20, help="allowed slowdown of a median, in percent")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    prefixes = [name.strip() for name in args.cases.split(",")] if args.cases else None
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = args.data_dir or tmp
+        os.makedirs(folder, exist_ok=True)
+        for size in sizes:
+            engine = create_engine(database(folder, size, args.seed))
+            # Every session of the services uses the generated database
+            Session.configure(bind=engine)
+            for name, call in cases(engine).items():
+                if prefixes and not name.startswith(tuple(prefixes)):
+                    continue
+                key = f"{name}@{size}"
+                results[key] = measure(call, args.rounds, args.warmup, args.min_time)
+                stats = results[key]
+                print(f"{key:<45} min {stats['min_ms']:>9.3f} ms  median {stats['median_ms']:>9.3f} ms  "
+                      f"mean {stats['mean_ms']:>9.3f} ms  stddev {stats['stddev_ms']:>8.3f} ms  ({stats['rounds']} calls)")
+            Session.configure(bind=None)
+            engine.dispose()
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump({
+                "python": platform.python_version(), "machine": platform.machine(), "seed": args.seed,
+                "results": results,
+            }, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        print(f"\nCompared with the baseline (threshold {args.threshold:g}%):")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Measures the cold start of a worker and checks the import-time budget.
+
+Usage (from the project folder):
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --check --budget-ms 1500
+
+Every run is a new Python process (like a new worker):
+    import      time to import app.app (python -X importtime, cumulative, includes its own overhead)
+    first req   time from the start of the import to the answer of GET /health, startup events included
+
+--check exits with code 1 if the import of app.app takes more than --budget-ms or imports one
+of the heavy modules that must stay lazy (see app/lazy.py). The runs work on a copy of
+data/db.sqlite, the database is never touched.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Only needed by some routes -> must not be imported when a worker starts
+LAZY_MODULES = ("pandas", "numpy", "msal", "xlsxwriter")
+
+FIRST_REQUEST = """
+import time
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+from app.app import app
+with TestClient(app) as client:
+    client.get("/health")
+print(time.perf_counter() - start)
+"""
+
+def import_profile(env: dict) -> dict:
+    """
+    Imports app.app in a new process with -X importtime.
+
+    Returns:
+        dict: {module: cumulative microseconds} for every module imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.app"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+def first_request(env: dict) -> float:
+    result = subprocess.run([sys.executable, "-c", FIRST_REQUEST], env=env, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level imports shown")
+    parser.add_argument("--check", action="store_true", help="fail if the import budget is exceeded")
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, "db.sqlite")
+        shutil.copy("data/db.sqlite", database)
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{database}", "PURGE_ENABLED": "0"}
+        env.pop("DATABASE_REPLICA_URL", None)
+
+        imports = []
+        requests = []
+        for _ in range(args.runs):
+            modules = import_profile(env)
+            imports.append(modules["app.app"] / 1000)
+            requests.append(first_request(env) * 1000)
+
+    print(f"{args.runs} runs")
+    print(f"import      median {statistics.median(imports):>8.1f} ms   min {min(imports):>8.1f} ms")
+    print(f"first req   median {statistics.median(requests):>8.1f} ms   min {min(requests):>8.1f} ms")
+
+    # Slowest imports of the last run (the modules imported directly by the app packages)
+    print("\nslowest imports (cumulative):")
+    top = sorted(((us, name) for name, us in modules.items() if "." not in name or name.startswith("app.")), reverse=True)
+    for us, name in top[:args.top]:
+        print(f"  {us / 1000:>8.1f} ms  {name}")
+
+    if not args.check:
+        return 0
+    failures = []
+    eager = [name for name in LAZY_MODULES if name in modules]
+    if eager:
+        failures.append(f"imported at startup: {', '.join(eager)} (use app.lazy.lazy_import)")
+    if min(imports) > args.budget_ms:
+        failures.append(f"import of app.app takes {min(imports):.1f} ms, budget {args.budget_ms:.0f} ms")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print(f"OK import budget {args.budget_ms:.0f} ms")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
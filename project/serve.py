@@ -0,0 +1,76 @@
+"""
+Production entry point: gunicorn master with uvicorn workers.
+
+Usage (from the project folder, Linux/macOS):
+    python serve.py
+
+Configuration (environment variables):
+    HOST (default 0.0.0.0), PORT (default 8000)
+    WEB_CONCURRENCY: number of workers (default: 2 x CPU + 1)
+    BACKLOG: pending connections (default 2048)
+    KEEP_ALIVE: seconds a keep-alive connection waits for the next request (default 5)
+    GRACEFUL_TIMEOUT: seconds given to the workers to finish their requests on reload/stop (default 30)
+    TIMEOUT: seconds before a stuck worker is restarted (default 60)
+    MAX_REQUESTS: restart a worker after this number of requests, 0 to disable (default 0)
+    MAX_REQUESTS_JITTER: random number of requests (0 to this value) added to MAX_REQUESTS per worker,
+        so the workers do not all restart at the same time (default 0)
+
+The app is imported once in the master before the workers are forked (preload): the code and
+the read-only data are shared between the workers. The database is initialized once in the
+master, the workers only run their own startup.
+Because of the preload, kill -HUP <master pid> only replaces the workers (forked again from the
+master, with the code it imported): a new version of the code needs a full restart.
+uvloop and httptools are used by the workers when they are installed.
+"""
+import multiprocessing
+import os
+from gunicorn.app.base import BaseApplication
+
+def default_workers() -> int:
+    return multiprocessing.cpu_count() * 2 + 1
+
+def on_starting(server):
+    # Runs in the master, before the workers exist -> exactly once
+    from app.app import initialise_database
+    initialise_database()
+    os.environ["APP_DB_INITIALIZED"] = "1"
+
+def post_fork(server, worker):
+    # The connections opened by the master must not be shared with the workers
+    from app.database import engine, replica_engine
+    engine.dispose(close=False)
+    replica_engine.dispose(close=False)
+
+class Server(BaseApplication):
+
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app.app import app
+        return app
+
+def options() -> dict:
+    return {
+        "bind": f"{os.environ.get('HOST', '0.0.0.0')}:{int(os.environ.get('PORT', 8000))}",
+        "workers": int(os.environ.get("WEB_CONCURRENCY", default_workers())),
+        # Worker of the uvicorn-worker package (uvicorn.workers is deprecated), picks uvloop and httptools when they are installed
+        "worker_class": "uvicorn_worker.UvicornWorker",
+        "preload_app": True,
+        "backlog": int(os.environ.get("BACKLOG", 2048)),
+        "keepalive": int(os.environ.get("KEEP_ALIVE", 5)),
+        "graceful_timeout": int(os.environ.get("GRACEFUL_TIMEOUT", 30)),
+        "timeout": int(os.environ.get("TIMEOUT", 60)),
+        "max_requests": int(os.environ.get("MAX_REQUESTS", 0)),
+        "max_requests_jitter": int(os.environ.get("MAX_REQUESTS_JITTER", 0)),
+        "on_starting": on_starting,
+        "post_fork": post_fork,
+    }
+
+if __name__ == "__main__":
+    Server(options()).run()